@@ -1,27 +1,124 @@
 from trade_tester import TradeTester
+from data_loader import load_ohlc
 from indicators import level_crosses, ma_trend
+from levels import stoploss_levels, takeprofit_levels
 import pandas as pd
 import numpy as np
 import talib as ta
 import streamlit as st
-from indicators import donchian_channel, channel_trend, trend_based_on_impulse_candles
-from candlestick_patterns import impulse_candles
+from indicators import channel_trend, trend_based_on_impulse_candles
 
 
-st.write('Trade Tester')
+# The app is split into cached stages: data -> trend -> entries -> SL/TP levels -> simulation -> stats -> figure.
+# Each stage is memoized on its own parameters only (LRU with MAX_ENTRIES),
+# so a widget change recomputes just the stages, that depend on it.
+DATA_PATH = 'eurusd_h1.csv'
+POINTS = 0.00001
+MAX_ENTRIES = 32
+MOVING_AVERAGES = {
+    'SMA': ta.SMA, 'EMA': ta.EMA, 'WMA': ta.WMA, 'KAMA': ta.KAMA, 'MAMA': ta.MAMA,
+    'DEMA': ta.DEMA, 'TEMA': ta.TEMA, 'TRIMA': ta.TRIMA, 'T3': ta.T3, 'LINREG': ta.LINEARREG,
+}
+ENTRY_INDICATORS = ('RSI', 'CCI', 'MFI')
+
+
+@st.cache_resource(max_entries=1)
+def load_data(path: str) -> pd.DataFrame:
+    return load_ohlc(path)
+
+
+@st.cache_data(max_entries=MAX_ENTRIES)
+def compute_trend(trend_type: str, trend_period: int, ma_thresh: int) -> np.ndarray:
+    df = load_data(DATA_PATH)
+
+    if trend_type in MOVING_AVERAGES:
+        ma = MOVING_AVERAGES[trend_type](df['close'], trend_period)
+        return ma_trend(ma, ma_thresh)
+
+    elif trend_type == 'HT_TRENDLINE':
+        ma = ta.HT_TRENDLINE(df['close'])
+        return ma_trend(ma, ma_thresh)
+
+    elif trend_type == 'Impulse':
+        return trend_based_on_impulse_candles(df['open'].values, df['high'].values, df['low'].values,
+                                              df['close'].values, trend_period, 4)
+
+    elif trend_type == 'Channel':
+        return channel_trend(df['high'], df['low'], trend_period)
+
+
+@st.cache_data(max_entries=MAX_ENTRIES)
+def compute_entries(entries_indicator: str, ind_period: int, cross_level: int) -> np.ndarray:
+    df = load_data(DATA_PATH)
+
+    if entries_indicator == 'RSI':
+        ind = ta.RSI(df['close'], ind_period)
+    elif entries_indicator == 'CCI':
+        ind = ta.CCI(df['high'], df['low'], df['close'], ind_period)
+    elif entries_indicator == 'MFI':
+        ind = ta.MFI(df['high'], df['low'], df['close'], df['volume'], ind_period)
+    return level_crosses(ind, cross_level)
+
 
-df = pd.read_csv('eurusd_h1.csv', parse_dates=['dt'])
-df.drop('pair', axis=1, inplace=True)
+@st.cache_data(max_entries=MAX_ENTRIES)
+def compute_sl_levels(sl_method: str, sl_value: int, sl_mult: int) -> tuple:
+    df = load_data(DATA_PATH)
+    return stoploss_levels(df['high'].values, df['low'].values, df['close'].values,
+                           sl_method, sl_value, sl_mult, POINTS, 5 * POINTS)
+
+
+@st.cache_data(max_entries=MAX_ENTRIES)
+def compute_tp_levels(tp_method: str, tp_value: int, tp_mult: int, sl_params: tuple = None) -> tuple:
+    """sl_params are required only by 'SL ratio' method"""
+    df = load_data(DATA_PATH)
+    sl_levels = compute_sl_levels(*sl_params) if tp_method == 'SL ratio' else None
+    return takeprofit_levels(df['high'].values, df['low'].values, df['close'].values,
+                             tp_method, tp_value, tp_mult, POINTS, sl_levels)
+
+
+@st.cache_resource(max_entries=MAX_ENTRIES)
+def run_simulation(trend_params: tuple, entry_params: tuple, sl_params: tuple, tp_params: tuple, n: int) -> TradeTester:
+    df = load_data(DATA_PATH)
+
+    tester = TradeTester(points=POINTS, show_progress=False)
+    tester.add_data(
+        datetime_data=df['dt'].values,
+        open_data=df['open'].values,
+        high_data=df['high'].values,
+        low_data=df['low'].values,
+        close_data=df['close'].values
+    )
+    tester.add_trend(np.array(compute_trend(*trend_params)))
+    tester.add_entries(compute_entries(*entry_params))
+    tester.set_stoploss_method(*sl_params)
+    tester.set_takeprofit_method(*tp_params)
+    tester.set_levels(compute_sl_levels(*sl_params),
+                      compute_tp_levels(*tp_params, sl_params if tp_params[0] == 'SL ratio' else None))
+    tester.run_strategy(n=n)
+    return tester
+
+
+@st.cache_data(max_entries=MAX_ENTRIES)
+def compute_statistic(trend_params: tuple, entry_params: tuple, sl_params: tuple, tp_params: tuple, n: int) -> pd.DataFrame:
+    return run_simulation(trend_params, entry_params, sl_params, tp_params, n).form_order_statistic()
+
+
+@st.cache_data(max_entries=MAX_ENTRIES)
+def draw_figure(trend_params: tuple, entry_params: tuple, sl_params: tuple, tp_params: tuple, n: int) -> bytes:
+    return run_simulation(trend_params, entry_params, sl_params, tp_params, n).render_orders_statistic('png')
+
+
+st.write('Trade Tester')
 
 params = st.sidebar.title('Parameters:')
 trend_period = st.sidebar.slider('Trend period', 2, 150, value=42)
 ind_period = st.sidebar.slider('Indicator period', 2, 150, value=24)
-trend_type = st.sidebar.radio('Choose trend type', 
-                              ['SMA', 'EMA', 'WMA', 'KAMA', 'MAMA', 
+trend_type = st.sidebar.radio('Choose trend type',
+                              ['SMA', 'EMA', 'WMA', 'KAMA', 'MAMA',
                                'DEMA', 'TEMA', 'TRIMA', 'T3',
-                               'HT_TRENDLINE', 'LINREG', 'Impulse', 'Channel'], 
+                               'HT_TRENDLINE', 'LINREG', 'Impulse', 'Channel'],
                               horizontal=True)
-entries_indicator = st.sidebar.radio('Choose indicator', ['RSI', 'CCI', 'MFI'])
+entries_indicator = st.sidebar.radio('Choose indicator', ENTRY_INDICATORS)
 cross_level = st.sidebar.radio('Level to cross', [50, 0])
 ma_thresh = st.sidebar.slider('MA Lag', 1, 50, 1)
 sl_method = st.sidebar.radio('Choose stop loss method', ['fixed', 'channel', 'atr', 'bar_extremum'])
@@ -31,102 +128,18 @@ tp_value = st.sidebar.slider('TP value', 1, 150, 24)
 sl_mult = st.sidebar.slider('SL mult', 1, 20, 1)
 tp_mult = st.sidebar.slider('TP mult', 1, 20, 6)
 
-if trend_type == 'SMA':
-    ma = ta.SMA(df['close'], trend_period)
-    trend = ma_trend(ma, ma_thresh)
-
-elif trend_type == 'EMA':
-    ma = ta.EMA(df['close'], trend_period)
-    trend = ma_trend(ma, ma_thresh)
-    
-elif trend_type == 'WMA':
-    ma = ta.WMA(df['close'], trend_period)
-    trend = ma_trend(ma, ma_thresh)
-
-elif trend_type == 'KAMA':
-    ma = ta.KAMA(df['close'], trend_period)
-    trend = ma_trend(ma, ma_thresh)
-    
-elif trend_type == 'MAMA':
-    ma = ta.MAMA(df['close'], trend_period)
-    trend = ma_trend(ma, ma_thresh)
-    
-elif trend_type == 'T3':
-    ma = ta.T3(df['close'], trend_period)
-    trend = ma_trend(ma, ma_thresh)
-
-elif trend_type == 'DEMA':
-    ma = ta.DEMA(df['close'], trend_period)
-    trend = ma_trend(ma, ma_thresh)
-    
-elif trend_type == 'TEMA':
-    ma = ta.TEMA(df['close'], trend_period)
-    trend = ma_trend(ma, ma_thresh)
-
-elif trend_type == 'TRIMA':
-    ma = ta.TRIMA(df['close'], trend_period)
-    trend = ma_trend(ma, ma_thresh)
-    
-elif trend_type == 'LINREG':
-    ma = ta.LINEARREG(df['close'], trend_period)
-    trend = ma_trend(ma, ma_thresh)
-
-elif trend_type == 'HT_TRENDLINE':
-    ma = ta.HT_TRENDLINE(df['close'])
-    trend = ma_trend(ma, ma_thresh)
-
-elif trend_type == 'Impulse':
-    imp = impulse_candles(df['open'].values, df['high'].values, df['low'].values, df['close'].values, trend_period, 4)
-    trend = trend_based_on_impulse_candles(df['open'].values, df['high'].values, df['low'].values, df['close'].values, imp)
-
-elif trend_type == 'Channel':
-    upper, middle, lower = donchian_channel(df['high'], df['low'], trend_period)
-    trend = channel_trend(df['high'], df['low'], upper, middle, lower)
-
-if entries_indicator == 'RSI':
-    ind = ta.RSI(df['close'], ind_period)
-    entries = level_crosses(ind, cross_level)
-
-elif entries_indicator == 'CCI':
-    ind = ta.CCI(df['high'], df['low'], df['close'], ind_period)
-    entries = level_crosses(ind, cross_level)
-
-elif entries_indicator == 'MFI':
-    ind = ta.MFI(df['high'], df['low'], df['close'], df['volume'], ind_period)
-    entries = level_crosses(ind, cross_level)
-
-df.dropna(axis=0, inplace=True)
-
-tester = TradeTester()
-tester.add_data(
-    datetime_data=df['dt'].values, 
-    open_data=df['open'].values, 
-    high_data=df['high'].values, 
-    low_data=df['low'].values, 
-    close_data=df['close'].values
-)
-tester.add_trend(np.array(trend))
-tester.add_entries(entries)
-
-if sl_method == 'fixed':
-    tester.set_stoploss_method('fixed', sl_value)
-elif sl_method == 'bar_extremum':
-    tester.set_stoploss_method('bar_extremum', sl_value)
-elif sl_method == 'atr':
-    tester.set_stoploss_method('atr', sl_value, sl_mult)
-elif sl_method == 'channel':
-    tester.set_stoploss_method('channel', sl_value)
-
-if tp_method == 'fixed':
-    tester.set_takeprofit_method('fixed', tp_value)
-elif tp_method == 'SL ratio':
-    tester.set_takeprofit_method('SL ratio', tp_mult)
-elif tp_method == 'atr':
-    tester.set_takeprofit_method('atr', tp_value, tp_mult)
-elif tp_method == 'channel':
-    tester.set_takeprofit_method('channel', tp_value)
-
-tester.run_strategy(n=trend_period)
-st.dataframe(tester.form_order_statistic())
-fig = tester.show_orders_statistic()
-st.pyplot(fig)
+# Stage keys contain only parameters, that change the result of the stage
+# (e.g. MA lag doesn't change impulse trend, mult is used only by ATR method),
+# default mults are the same as TradeTester ones
+trend_params = (trend_type,
+                trend_period if trend_type != 'HT_TRENDLINE' else None,
+                ma_thresh if trend_type not in ('Impulse', 'Channel') else None)
+entry_params = (entries_indicator, ind_period, cross_level)
+sl_params = (sl_method, sl_value, sl_mult if sl_method == 'atr' else 2)
+if tp_method == 'SL ratio':
+    tp_params = ('SL ratio', tp_mult, 5)
+else:
+    tp_params = (tp_method, tp_value, tp_mult if tp_method == 'atr' else 5)
+
+st.dataframe(compute_statistic(trend_params, entry_params, sl_params, tp_params, trend_period))
+st.image(draw_figure(trend_params, entry_params, sl_params, tp_params, trend_period))
@@ -0,0 +1,182 @@
+"""
+Benchmark suite for the backtest hot paths.
+Times each case on eurusd_h1.csv and on random walk data of several sizes, records peak memory,
+saves the results as JSON baseline and flags regressions against it.
+
+Save baseline:     python benchmark.py --save
+Check regressions: python benchmark.py --threshold 0.2
+Only small scales: python benchmark.py --scales 10000 100000
+"""
+import os
+import sys
+import json
+import argparse
+import platform
+import tracemalloc
+from datetime import datetime
+from time import perf_counter
+from trade_tester import TradeTester
+from data_loader import load_ohlc
+from indicators import level_crosses, ma_trend, channel_trend
+from candlestick_patterns import impulse_candles, candle_patterns
+from calculate_statistic import get_update_count, extremum_update
+from levels import stoploss_levels, takeprofit_levels
+from utils import random_walk_ohlc
+from indicator_cache import CachedTalib, IndicatorCache
+import numpy as np
+import pandas as pd
+import talib as ta
+
+
+SCALES = (10_000, 100_000, 1_000_000, 10_000_000)
+BASELINE = 'benchmark_baseline.json'
+POINTS = 0.00001
+PERIOD = 42
+SL_METHODS = ('fixed', 'percent', 'bar_extremum', 'atr', 'channel')
+TP_METHODS = ('fixed', 'atr', 'channel', 'SL ratio')
+# Slowdowns shorter than this (seconds) are timer noise of fast cases, not regressions
+MIN_DELTA = 0.005
+
+
+def measure(func, repeat: int = 3) -> dict:
+    """Return the best time of REPEAT runs and peak memory (MB) of one more run under tracemalloc"""
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        func()
+        times.append(perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'time': min(times), 'peak_mb': peak / 2 ** 20}
+
+
+def create_tester(df: pd.DataFrame, trend: np.ndarray, entries: np.ndarray) -> TradeTester:
+    tester = TradeTester(points=POINTS, show_progress=False)
+    tester.add_data(
+        datetime_data=df['dt'].values,
+        open_data=df['open'].values,
+        high_data=df['high'].values,
+        low_data=df['low'].values,
+        close_data=df['close'].values
+    )
+    tester.add_trend(trend)
+    tester.add_entries(entries)
+    tester.set_stoploss_method('channel', PERIOD)
+    tester.set_takeprofit_method('atr', PERIOD, 4)
+    return tester
+
+
+def benchmark_cases(df: pd.DataFrame) -> dict:
+    """Return {case name: function without arguments}"""
+    op, hi, lo, cl = (df[c].values for c in ('open', 'high', 'low', 'close'))
+    trend = ma_trend(pd.Series(ta.SMA(cl, PERIOD)), 1)
+    entries = level_crosses(pd.Series(ta.MFI(hi, lo, cl, df['volume'].values, PERIOD)), 50)
+    imp = impulse_candles(op, hi, lo, cl, 21, 4)
+
+    tester = create_tester(df, trend, entries)
+    tester.run_strategy(n=PERIOD)
+    sl_levels = stoploss_levels(hi, lo, cl, 'atr', PERIOD, 2, POINTS, 5 * POINTS)
+
+    cases = {'run_strategy': lambda: create_tester(df, trend, entries).run_strategy(n=PERIOD)}
+    for method in SL_METHODS:
+        cases[f'sl: {method}'] = lambda method=method: stoploss_levels(hi, lo, cl, method, PERIOD, 2, POINTS, 5 * POINTS)
+    for method in TP_METHODS:
+        cases[f'tp: {method}'] = lambda method=method: takeprofit_levels(hi, lo, cl, method, PERIOD, 5, POINTS, sl_levels)
+    cases['form_order_statistic'] = tester.form_order_statistic
+    cases['candle_patterns'] = lambda: candle_patterns(op, hi, lo, cl, 21, 4)
+    cases['channel_trend'] = lambda: channel_trend(df['high'], df['low'], PERIOD)
+    cases['get_update_count'] = lambda: get_update_count(df, imp)
+    cases['extremum_update: channel'] = lambda: extremum_update(df, 21, 'channel')
+    cases['extremum_update: bands'] = lambda: extremum_update(df, 21, 'bands')
+
+    def indicators(lib):
+        return (lib.SMA(df['close'], PERIOD), lib.ATR(df['high'], df['low'], df['close'], PERIOD),
+                lib.MFI(df['high'], df['low'], df['close'], df['volume'], PERIOD))
+
+    cached_ta = CachedTalib(IndicatorCache(max_bytes=2 ** 30))
+    indicators(cached_ta)
+    cases['talib indicators'] = lambda: indicators(ta)
+    cases['cached talib: hit'] = lambda: indicators(cached_ta)
+    return cases
+
+
+def run_benchmarks(scales: tuple = SCALES, csv_path: str = 'eurusd_h1.csv', repeat: int = 3) -> dict:
+    """Return {dataset: {case: {'time': seconds, 'peak_mb': MB}}}"""
+    datasets = {}
+    if csv_path and os.path.exists(csv_path):
+        datasets[os.path.basename(csv_path)] = lambda: load_ohlc(csv_path)
+    for n_bars in scales:
+        datasets[f'random walk {n_bars}'] = lambda n_bars=n_bars: random_walk_ohlc(n_bars)
+
+    results = {}
+    for name, load in datasets.items():
+        df = load()
+        results[name] = {}
+        for case, func in benchmark_cases(df).items():
+            results[name][case] = measure(func, repeat)
+            print(f'{name:>24} | {case:<26} | {results[name][case]["time"]:10.4f} s '
+                  f'| {results[name][case]["peak_mb"]:10.1f} MB', flush=True)
+        del df
+    return results
+
+
+def find_regressions(results: dict, baseline: dict, threshold: float = 0.2,
+                     min_delta: float = MIN_DELTA) -> list[dict]:
+    """Return cases, that are slower than baseline by more than THRESHOLD (0.2 = 20%) and by more than MIN_DELTA seconds"""
+    regressions = []
+    for dataset, cases in results.items():
+        for case, result in cases.items():
+            base = baseline.get(dataset, {}).get(case)
+            if base is None:
+                continue
+            if result['time'] > base['time'] * (1 + threshold) and result['time'] - base['time'] > min_delta:
+                regressions.append({'dataset': dataset, 'case': case,
+                                    'baseline (s)': base['time'], 'current (s)': result['time'],
+                                    'slowdown': result['time'] / base['time']})
+    return regressions
+
+
+def save_baseline(results: dict, path: str = BASELINE):
+    meta = {'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor()}
+    with open(path, 'w') as f:
+        json.dump({'meta': meta, 'results': results}, f, indent=2)
+
+
+def load_baseline(path: str = BASELINE) -> dict:
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark backtest hot paths')
+    parser.add_argument('--scales', type=int, nargs='*', default=list(SCALES), help='sizes of random walk data')
+    parser.add_argument('--csv', default='eurusd_h1.csv', help='real data to benchmark')
+    parser.add_argument('--repeat', type=int, default=3, help='number of timed runs of each case')
+    parser.add_argument('--baseline', default=BASELINE, help='JSON file with baseline')
+    parser.add_argument('--save', action='store_true', help='save results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown (0.2 = 20%%)')
+    parser.add_argument('--min-delta', type=float, default=MIN_DELTA, help='ignored slowdown in seconds')
+    args = parser.parse_args()
+
+    results = run_benchmarks(tuple(args.scales), args.csv, args.repeat)
+
+    if args.save:
+        save_baseline(results, args.baseline)
+        print(f'Baseline saved to {args.baseline}')
+    elif os.path.exists(args.baseline):
+        regressions = find_regressions(results, load_baseline(args.baseline), args.threshold, args.min_delta)
+        if regressions:
+            print('Regressions:')
+            print(pd.DataFrame(regressions).to_string(index=False))
+            sys.exit(1)
+        print('No regressions')
+    else:
+        print(f'No baseline found, run with --save to create {args.baseline}')
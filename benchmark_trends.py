@@ -0,0 +1,98 @@
+"""
+Compare vectorized latch trends from indicators.py with the previous python loops.
+Run: python benchmark_trends.py [n_synthetic_bars]
+"""
+import sys
+from time import perf_counter
+from indicators import donchian_channel, chande_kroll_stop, impulse_candles
+from indicators import channel_trend, chande_kroll_stop_trend, trend_based_on_impulse_candles
+from utils import random_walk_ohlc
+from data_loader import load_ohlc
+import numpy as np
+import pandas as pd
+
+
+def channel_trend_loop(high: pd.Series, low: pd.Series, period: int = 24):
+    hi = high.values
+    lo = low.values
+    hi_channel, mi_channel, lo_channel = donchian_channel(high, low, period)
+    flag = 0
+    trend = []
+    for i in range(len(hi)):
+        if flag != 1 and hi[i] >= hi_channel[i]:
+            flag = 1 if lo[i] > mi_channel[i] else 0
+        elif flag != -1 and lo[i] <= lo_channel[i]:
+            flag = -1 if hi[i] < mi_channel[i] else 0
+        trend.append(flag)
+    return np.array(trend)
+
+
+def chande_kroll_stop_trend_loop(op, hi, lo, cl, p: int = 10, x: int = 1, q: int = 9):
+    upper, lower = chande_kroll_stop(hi, lo, cl, p, x, q)
+    flag = 0
+    trend = []
+    for i in range(len(hi)):
+        if flag != 1 and hi[i] >= upper[i]:
+            flag = 1
+        elif flag != -1 and lo[i] <= lower[i]:
+            flag = -1
+        trend.append(flag)
+    return np.array(trend)
+
+
+def trend_based_on_impulse_candles_loop(op, hi, lo, cl, period: int = 21, n_split: int = 3):
+    imp = impulse_candles(op, hi, lo, cl, period, n_split)
+    flag = 0
+    current_level = 0
+    trend = []
+    for i in range(len(op)):
+        if imp[i] == 1:
+            flag = 1
+        elif imp[i] == -1:
+            flag = -1
+        elif flag == 1 and cl[i] < current_level:
+            flag = 0
+        elif flag == -1 and cl[i] > current_level:
+            flag = 0
+        trend.append(flag)
+    return np.array(trend)
+
+
+def timeit(func, *args):
+    start = perf_counter()
+    result = func(*args)
+    return perf_counter() - start, np.asarray(result)
+
+
+def compare(name: str, df: pd.DataFrame):
+    op, hi, lo, cl = (df[c].values for c in ('open', 'high', 'low', 'close'))
+    cases = {
+        'channel_trend': (channel_trend_loop, channel_trend, (df['high'], df['low'], 24)),
+        'chande_kroll_stop_trend': (chande_kroll_stop_trend_loop, chande_kroll_stop_trend, (op, hi, lo, cl)),
+        'trend_based_on_impulse_candles': (trend_based_on_impulse_candles_loop, trend_based_on_impulse_candles,
+                                           (op, hi, lo, cl, 21, 3)),
+    }
+    rows = []
+    for case, (loop_func, vector_func, args) in cases.items():
+        loop_time, expected = timeit(loop_func, *args)
+        vector_time, result = timeit(vector_func, *args)
+        rows.append({
+            'data': name,
+            'bars': df.shape[0],
+            'function': case,
+            'loop (s)': loop_time,
+            'vectorized (s)': vector_time,
+            'speedup': loop_time / vector_time,
+            'identical': np.array_equal(expected, result),
+        })
+    return rows
+
+
+if __name__ == '__main__':
+    n_bars = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+
+    df = load_ohlc('eurusd_h1.csv')
+
+    rows = compare('eurusd_h1.csv', df)
+    rows += compare('random walk', random_walk_ohlc(n_bars))
+    print(pd.DataFrame(rows).to_string(index=False))
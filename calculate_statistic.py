@@ -1,10 +1,37 @@
-from tqdm import tqdm
 from typing import Literal
 from indicators import donchian_channel
+import numpy as np
 import pandas as pd
 import talib as ta
 
 
+def next_break_index(values: np.ndarray, direction: int = 1) -> np.ndarray:
+    """
+    Return for each bar the index of the next bar, which breaks its value:
+    strictly greater value for direction 1 (high is updated), strictly lower for direction -1 (low is updated).
+    Built in O(n) with monotonic stack.
+    :param values: high data for direction 1, low data for direction -1
+    :param direction: 1 or -1
+    :return: np.array of bar indices, -1 if the value is never broken
+    """
+    values = np.asarray(values).tolist()
+    result = [-1] * len(values)
+    stack = []
+
+    if direction == 1:
+        for i, value in enumerate(values):
+            while stack and values[stack[-1]] < value:
+                result[stack.pop()] = i
+            stack.append(i)
+    else:
+        for i, value in enumerate(values):
+            while stack and values[stack[-1]] > value:
+                result[stack.pop()] = i
+            stack.append(i)
+
+    return np.array(result, dtype=np.int64)
+
+
 def get_update_count(data: pd.DataFrame, candles2use: pd.Series):
     """
     Calculates, how many times we have an update of max/min of specified candle
@@ -13,40 +40,41 @@ def get_update_count(data: pd.DataFrame, candles2use: pd.Series):
     """
     update_count = {-1: {1: 0, -1: 0},
                     1: {1: 0, -1: 0}}
-    hi = data['high'].values
-    lo = data['low'].values
-
-    for idx in tqdm(range(data.shape[0])):
-        hii = hi[idx]
-        loi = lo[idx]
-        filter_candle = candles2use[idx]
-
-        if filter_candle == 0:
-            continue
-
-        for i in range(1, data.shape[0] - idx):
-            hin = hi[idx + i]
-            lon = lo[idx + i]
-
-            if filter_candle == 1:
-                if lon < loi:
-                    update_count[1][-1] += 1
-                    break
-                elif hin > hii:
-                    update_count[1][1] += 1
-                    break
-
-            elif filter_candle == -1:
-                if hin > hii:
-                    update_count[-1][1] += 1
-                    break
-                elif lon < loi:
-                    update_count[-1][-1] += 1
-                    break
+    high_break = next_break_index(data['high'].values, 1)
+    low_break = next_break_index(data['low'].values, -1)
+    candles2use = np.asarray(candles2use)
+
+    for filter_candle in (1, -1):
+        use = candles2use == filter_candle
+        hi_idx = high_break[use]
+        lo_idx = low_break[use]
+        hi_updated = hi_idx != -1
+        lo_updated = lo_idx != -1
+
+        # If both are updated on the same bar, bullish candle counts low update, bearish candle - high update
+        if filter_candle == 1:
+            hi_first = hi_updated & (~lo_updated | (hi_idx < lo_idx))
+            lo_first = lo_updated & (~hi_updated | (lo_idx <= hi_idx))
+        else:
+            hi_first = hi_updated & (~lo_updated | (hi_idx <= lo_idx))
+            lo_first = lo_updated & (~hi_updated | (lo_idx < hi_idx))
+
+        update_count[filter_candle][1] = int(hi_first.sum())
+        update_count[filter_candle][-1] = int(lo_first.sum())
 
     return update_count
 
 
+def forward_max(values: np.ndarray, period: int) -> np.ndarray:
+    """Return max value of the bar and PERIOD-1 next bars (the window is cut at the end of data)"""
+    return pd.Series(values[::-1]).rolling(period, min_periods=1).max().values[::-1]
+
+
+def forward_min(values: np.ndarray, period: int) -> np.ndarray:
+    """Return min value of the bar and PERIOD-1 next bars (the window is cut at the end of data)"""
+    return pd.Series(values[::-1]).rolling(period, min_periods=1).min().values[::-1]
+
+
 def extremum_update(data: pd.DataFrame, period: int = 21, method: Literal['channel', 'bands'] = 'bands'):
     """
     Return 1, if the price updates the high border in PERIOD time
@@ -55,7 +83,7 @@ def extremum_update(data: pd.DataFrame, period: int = 21, method: Literal['chann
     :param data: OHLC data. Columns must be named as 'open', 'high', 'low', 'close'
     :param period: the number of bars, that will be used
     :param method: Channel uses Donchian channel, bands uses Bollinger Bands method
-    :return: pd.Series | np.array
+    :return: np.array
     """
     if method == 'channel':
         up, low, mid = donchian_channel(data['high'], data['low'], period)
@@ -63,20 +91,14 @@ def extremum_update(data: pd.DataFrame, period: int = 21, method: Literal['chann
         up, mid, low = ta.BBANDS(data['close'], period)
     else:
         raise ValueError("Choose either 'channel' or 'bands'")
-    output = []
-
-    for i in range(data.shape[0]):
-        chunk_data = data.iloc[i:i + period, :]
-        chunk_up = up[i]
-        chunk_low = low[i]
-
-        if any(chunk_data.high > chunk_up):
-            output.append(1)
-        elif any(chunk_data.low < chunk_low):
-            output.append(-1)
-        else:
-            output.append(0)
-    return output
+    up = np.asarray(up)
+    low = np.asarray(low)
+    future_high = forward_max(data['high'].values, period)
+    future_low = forward_min(data['low'].values, period)
+
+    return np.where(future_high > up,  1,
+           np.where(future_low < low, -1,
+                                       0))
 
 
 def count_combinations(data, normalize: bool = True):
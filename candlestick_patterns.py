@@ -3,34 +3,123 @@ import numpy as np
 import talib as ta
 
 
-def impulse_candles(op, hi, lo, cl, period: int = 21, n_split: int = 4):
+PATTERNS = ('impulse', 'pinbar', 'kangaroo', 'inside_bar', 'outside_bar', 'engulfing')
+
+
+def candle_features(op, hi, lo, cl, period: int = 21) -> dict:
+    """
+    Calculate candle parts, that are shared by all patterns, once:
+    range, body, top/bottom of the body, wicks, direction (1 - bullish, -1 - bearish, 0 - doji) and ATR
+    """
+    op, hi, lo, cl = (np.asarray(x, dtype=np.float64) for x in (op, hi, lo, cl))
+    top = np.maximum(op, cl)
+    bottom = np.minimum(op, cl)
+    return {
+        'op': op, 'hi': hi, 'lo': lo, 'cl': cl,
+        'range': hi - lo,
+        'body': top - bottom,
+        'top': top,
+        'bottom': bottom,
+        'upper_wick': hi - top,
+        'lower_wick': bottom - lo,
+        'direction': np.sign(cl - op).astype(np.int8),
+        'atr': ta.ATR(hi, lo, cl, period),
+    }
+
+
+def _prev(values: np.ndarray) -> np.ndarray:
+    """Values of the previous bar, the first bar gets NaN, so it never forms a pattern"""
+    return np.concatenate([[np.nan], values[:-1]])
+
+
+def _signed(bull: np.ndarray, bear: np.ndarray) -> np.ndarray:
+    return np.where(bull, 1, np.where(bear, -1, 0)).astype(np.int8)
+
+
+def impulse_candles(op, hi, lo, cl, period: int = 21, n_split: int = 4, features: dict = None):
     """
     Impulse candle is the candle, that have their range greater than average true range and closes around its MAX/MIN values
     """
-    atr = ta.ATR(hi, lo, cl, period)
-    bar_range = hi - lo
-    chunk = bar_range / n_split
-    return np.where((bar_range > atr) & (cl > op) & (cl > hi - chunk),  1,
-           np.where((bar_range > atr) & (cl < op) & (cl < lo + chunk), -1, 
-                                                                        0))
-
-
-def pinbar(op, hi, lo, cl):
-    bar_range = hi - lo
-    chunk = bar_range / 3
-    if cl > hi - chunk and op > hi - chunk:
-        return 1
-    elif cl < lo + chunk and op < lo + chunk:
-        return -1
-    else:
-        return 0
-
-
-def kangaroo(op, hi, lo, cl, period: int = 21):
-    bar_range = hi - lo
-    atr = ta.ATR(hi, lo, cl, period)
-    if bar_range > atr:
-        body = abs(op - cl)
-        pb = pinbar(op, hi, lo, cl)
-        pass
-    # TODO: continue kangaroo!
\ No newline at end of file
+    f = features or candle_features(op, hi, lo, cl, period)
+    chunk = f['range'] / n_split
+    big = f['range'] > f['atr']
+    return _signed(big & (f['cl'] > f['op']) & (f['cl'] > f['hi'] - chunk),
+                   big & (f['cl'] < f['op']) & (f['cl'] < f['lo'] + chunk))
+
+
+def pinbar(op, hi, lo, cl, features: dict = None):
+    """
+    Pinbar opens and closes in the upper third of the range (1, long lower tail)
+    or in the lower third (-1, long upper tail)
+    """
+    f = features or candle_features(op, hi, lo, cl)
+    chunk = f['range'] / 3
+    return _signed(f['bottom'] > f['hi'] - chunk, f['top'] < f['lo'] + chunk)
+
+
+def kangaroo(op, hi, lo, cl, period: int = 21, features: dict = None):
+    """
+    Kangaroo tail is the pinbar with range greater than average true range,
+    which body is inside the range of the previous bar
+    """
+    f = features or candle_features(op, hi, lo, cl, period)
+    pb = pinbar(op, hi, lo, cl, f)
+    inside = (f['bottom'] >= _prev(f['lo'])) & (f['top'] <= _prev(f['hi']))
+    return np.where((f['range'] > f['atr']) & inside, pb, 0).astype(np.int8)
+
+
+def inside_bar(hi, lo):
+    """1 - the range of the bar is inside the range of the previous bar"""
+    hi, lo = np.asarray(hi, dtype=np.float64), np.asarray(lo, dtype=np.float64)
+    return ((hi < _prev(hi)) & (lo > _prev(lo))).astype(np.int8)
+
+
+def outside_bar(hi, lo):
+    """1 - the range of the bar covers the range of the previous bar"""
+    hi, lo = np.asarray(hi, dtype=np.float64), np.asarray(lo, dtype=np.float64)
+    return ((hi > _prev(hi)) & (lo < _prev(lo))).astype(np.int8)
+
+
+def engulfing(op, hi, lo, cl, features: dict = None):
+    """
+    1 - bullish candle, which body engulfs the body of the previous bearish candle,
+    -1 - bearish candle, which body engulfs the body of the previous bullish candle
+    """
+    f = features or candle_features(op, hi, lo, cl)
+    prev_dir = np.concatenate([[0], f['direction'][:-1]])
+    engulfs = (f['top'] > _prev(f['top'])) & (f['bottom'] < _prev(f['bottom']))
+    return _signed(engulfs & (f['direction'] == 1) & (prev_dir == -1),
+                   engulfs & (f['direction'] == -1) & (prev_dir == 1))
+
+
+def candle_patterns(op, hi, lo, cl, period: int = 21, n_split: int = 4) -> np.ndarray:
+    """
+    Evaluate all patterns at once, candle features are calculated one time
+    :return: int8 matrix (n_bars, len(PATTERNS)), columns are in PATTERNS order
+    """
+    f = candle_features(op, hi, lo, cl, period)
+    matrix = np.empty((f['cl'].shape[0], len(PATTERNS)), dtype=np.int8)
+    matrix[:, 0] = impulse_candles(op, hi, lo, cl, period, n_split, f)
+    matrix[:, 1] = pinbar(op, hi, lo, cl, f)
+    matrix[:, 2] = kangaroo(op, hi, lo, cl, period, f)
+    matrix[:, 3] = inside_bar(f['hi'], f['lo'])
+    matrix[:, 4] = outside_bar(f['hi'], f['lo'])
+    matrix[:, 5] = engulfing(op, hi, lo, cl, f)
+    return matrix
+
+
+def screen_patterns(data: dict, period: int = 21, n_split: int = 4, last: int = 1) -> pd.DataFrame:
+    """
+    Screen many symbols for patterns on their last bars
+    :param data: {symbol: pd.DataFrame with open, high, low, close columns}
+    :param last: number of the last bars to check, pattern is shown if it was formed on any of them
+    :return: pd.DataFrame (symbols x PATTERNS) with the pattern value of the latest bar, where it was formed
+    """
+    rows = {}
+    for symbol, df in data.items():
+        patterns = candle_patterns(df['open'].values, df['high'].values, df['low'].values, df['close'].values,
+                                   period, n_split)[-last:]
+        # the latest nonzero value of each pattern
+        latest = np.where(patterns != 0, np.arange(patterns.shape[0])[:, np.newaxis], -1).max(axis=0)
+        rows[symbol] = np.where(latest >= 0, patterns[np.maximum(latest, 0), np.arange(len(PATTERNS))], 0)
+    return pd.DataFrame.from_dict(rows, orient='index', columns=list(PATTERNS)).astype(np.int8)
@@ -1,5 +1,6 @@
 from itertools import groupby
 from indicators import impulse_candles
+from data_loader import load_ohlc
 import pandas as pd
 
 
@@ -32,8 +33,7 @@ def count_combinations(data, normalize: bool = True):
     return combinations
 
 
-df = pd.read_csv('eurusd_h1.csv', parse_dates=['dt'])
-df.drop('pair', axis=1, inplace=True)
+df = load_ohlc('eurusd_h1.csv')
 
 imp = impulse_candles(df['open'], df['high'], df['low'], df['close'], 21, 4)
 print(pd.Series(imp).value_counts(normalize=True))
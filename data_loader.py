@@ -0,0 +1,131 @@
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+
+
+CACHE_DIR = '.ohlc_cache'
+CACHE_VERSION = 1
+CHUNK_ROWS = 1_000_000
+
+
+def _cache_path(path: str, cache_dir: str = None) -> str:
+    """Return cache directory of the csv file. It's placed near the csv, unless cache_dir is set"""
+    path = os.path.abspath(path)
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(path), CACHE_DIR)
+    name, _ = os.path.splitext(os.path.basename(path))
+    path_hash = hashlib.sha1(path.encode()).hexdigest()[:10]
+    return os.path.join(cache_dir, f'{name}_{path_hash}')
+
+
+def _file_key(path: str) -> dict:
+    stat = os.stat(path)
+    return {'version': CACHE_VERSION, 'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _read_meta(cache_path: str):
+    try:
+        with open(os.path.join(cache_path, 'meta.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _raw_to_npy(raw_path: str, npy_path: str, dtype, rows: int):
+    """Turn raw binary column into .npy file: write the header and copy the data without reading it into RAM"""
+    header = {'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)), 'fortran_order': False, 'shape': (rows,)}
+    with open(npy_path, 'wb') as out, open(raw_path, 'rb') as raw:
+        np.lib.format.write_array_header_1_0(out, header)
+        shutil.copyfileobj(raw, out)
+    os.remove(raw_path)
+
+
+def _build_cache(path: str, cache_path: str, dt_column: str) -> dict:
+    """
+    Parse csv and store datetime as epoch int64 (ns, UTC) and all numeric columns as float64 .npy files.
+    The csv is parsed in chunks of CHUNK_ROWS rows, so big files (e.g. M1 history) are never fully in RAM
+    """
+    # write into temporary dir and then replace, so readers never see half written cache
+    tmp_path = f'{cache_path}.tmp{os.getpid()}'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    columns = None
+    tz = None
+    rows = 0
+    files = {}
+    try:
+        for df in pd.read_csv(path, parse_dates=[dt_column], chunksize=CHUNK_ROWS):
+            dt = df[dt_column]
+            if columns is None:
+                tz = str(dt.dt.tz) if dt.dt.tz is not None else None
+                columns = [c for c in df.columns if c != dt_column and pd.api.types.is_numeric_dtype(df[c])]
+                files = {c: open(os.path.join(tmp_path, f'{c}.raw'), 'wb') for c in [dt_column] + columns}
+            if dt.dt.tz is not None:
+                dt = dt.dt.tz_convert('UTC').dt.tz_localize(None)
+            files[dt_column].write(dt.values.astype('datetime64[ns]').view(np.int64).tobytes())
+            for column in columns:
+                files[column].write(df[column].values.astype(np.float64).tobytes())
+            rows += df.shape[0]
+    finally:
+        for f in files.values():
+            f.close()
+
+    if columns is None:
+        # csv with header only
+        df = pd.read_csv(path, nrows=0)
+        columns = [c for c in df.columns if c != dt_column]
+        for column in [dt_column] + columns:
+            open(os.path.join(tmp_path, f'{column}.raw'), 'wb').close()
+    _raw_to_npy(os.path.join(tmp_path, f'{dt_column}.raw'), os.path.join(tmp_path, f'{dt_column}.npy'), np.int64, rows)
+    for column in columns:
+        _raw_to_npy(os.path.join(tmp_path, f'{column}.raw'), os.path.join(tmp_path, f'{column}.npy'), np.float64, rows)
+
+    meta = dict(_file_key(path), dt_column=dt_column, tz=tz, columns=columns, rows=rows)
+    with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+    shutil.rmtree(cache_path, ignore_errors=True)
+    os.replace(tmp_path, cache_path)
+    return meta
+
+
+def load_arrays(path: str, dt_column: str = 'dt', cache_dir: str = None, mmap: bool = True) -> dict:
+    """
+    Return columns of OHLC csv file as numpy arrays, using binary cache.
+    The cache is rebuilt, if path, size or modification time of the csv file changes.
+    :param path: csv file
+    :param dt_column: datetime column
+    :param cache_dir: directory for cache, default is .ohlc_cache near the csv file
+    :param mmap: if True, arrays are memory-mapped (read only) instead of being read into RAM
+    :return: dict {column: np.array}, datetime is epoch int64 (ns, UTC), other columns are float64.
+        Key 'meta' contains cache info, including original timezone
+    """
+    cache_path = _cache_path(path, cache_dir)
+    meta = _read_meta(cache_path)
+    key = _file_key(path)
+    if meta is None or any(meta.get(k) != v for k, v in key.items()) or meta.get('dt_column') != dt_column:
+        meta = _build_cache(path, cache_path, dt_column)
+
+    mmap_mode = 'r' if mmap else None
+    arrays = {column: np.load(os.path.join(cache_path, f'{column}.npy'), mmap_mode=mmap_mode)
+              for column in [dt_column] + meta['columns']}
+    arrays['meta'] = meta
+    return arrays
+
+
+def load_ohlc(path: str, dt_column: str = 'dt', cache_dir: str = None, mmap: bool = False) -> pd.DataFrame:
+    """
+    Return OHLC csv file as pd.DataFrame, the same as pd.read_csv(path, parse_dates=['dt'])
+    without non-numeric columns (like 'pair'). Cold load parses csv and writes binary cache,
+    warm loads read the cache (see load_arrays)
+    """
+    arrays = load_arrays(path, dt_column, cache_dir, mmap)
+    meta = arrays.pop('meta')
+    dt = pd.to_datetime(arrays.pop(dt_column).view('datetime64[ns]'))
+    if meta['tz'] is not None:
+        dt = dt.tz_localize('UTC').tz_convert(meta['tz'])
+    return pd.DataFrame({dt_column: dt, **arrays}, copy=False)
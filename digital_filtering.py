@@ -1,4 +1,5 @@
 from indicators import impulse_candles
+from data_loader import load_ohlc
 import numpy as np
 import pandas as pd
 from scipy import signal
@@ -7,9 +8,8 @@ import plotly.graph_objects as go
 from indicators import slow_adaptive_trend_line
 
 
-data = pd.read_csv('eurusd_h1.csv', parse_dates=['dt'])
-data = data.iloc[-1000:]
-data.drop('pair', axis=1, inplace=True)
+data = load_ohlc('eurusd_h1.csv')
+data = data.iloc[-1000:].copy()
 
 PERIOD = 21
 cutoff_frequency = 2.0  # Adjust this value based on your specific data
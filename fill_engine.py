@@ -0,0 +1,64 @@
+import numpy as np
+
+
+# The first chunk is small because most orders are filled/closed within a few bars,
+# then chunk size grows, so a long hold costs O(log n) numpy calls instead of O(n) python steps
+FIRST_CHUNK = 32
+MAX_CHUNK = 65536
+
+
+def _first_true(mask_fn, start: int, n: int, chunk: int = FIRST_CHUNK) -> int:
+    """
+    Scan [start, n) in growing chunks and return the first index, where mask_fn(begin, end) is True
+    :param mask_fn: function, that returns boolean array for the bars [begin, end)
+    :param start: first bar to check
+    :param n: total number of bars
+    :return: bar index or -1 if mask is never True
+    """
+    pos = start
+    while pos < n:
+        end = min(pos + chunk, n)
+        hits = mask_fn(pos, end)
+        hit = hits.argmax()
+        if hits[hit]:
+            return pos + int(hit)
+        pos = end
+        chunk = min(chunk * 2, MAX_CHUNK)
+    return -1
+
+
+def first_touch(series: np.ndarray, start: int, level: float, direction: int, inclusive: bool = False) -> int:
+    """
+    Return the first bar from start, where the series crosses the price level
+    :param series: high data for direction 1, low data for direction -1
+    :param start: first bar to check
+    :param level: price level
+    :param direction: 1 - series goes above the level, -1 - series goes below the level
+    :param inclusive: if True, touching the level (>= or <=) is enough
+    :return: bar index or -1 if the level is never crossed
+    """
+    if direction == 1:
+        if inclusive:
+            return _first_true(lambda b, e: series[b:e] >= level, start, series.shape[0])
+        return _first_true(lambda b, e: series[b:e] > level, start, series.shape[0])
+    else:
+        if inclusive:
+            return _first_true(lambda b, e: series[b:e] <= level, start, series.shape[0])
+        return _first_true(lambda b, e: series[b:e] < level, start, series.shape[0])
+
+
+def first_exit(hi: np.ndarray, lo: np.ndarray, start: int, sl: float, tp: float, direction: int) -> int:
+    """
+    Return the first bar from start, where either stop loss or take profit is touched
+    :param hi: high data
+    :param lo: low data
+    :param start: first bar to check
+    :param sl: stop loss level
+    :param tp: take profit level
+    :param direction: 1 - buy order, -1 - sell order
+    :return: bar index or -1 if neither level is touched
+    """
+    if direction == 1:
+        return _first_true(lambda b, e: (lo[b:e] <= sl) | (hi[b:e] >= tp), start, hi.shape[0])
+    else:
+        return _first_true(lambda b, e: (hi[b:e] >= sl) | (lo[b:e] <= tp), start, hi.shape[0])
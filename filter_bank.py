@@ -0,0 +1,163 @@
+import numpy as np
+from scipy import signal
+
+
+# Weights of the adaptive trend lines, the first weight is applied to the current bar
+SATL_WEIGHTS = np.array([
+    0.0982862174, 0.0975682269, 0.0961401078, 0.0940230544, 0.091243709, 0.0878391006,
+    0.0838544303, 0.079340635, 0.0743569346, 0.0689666682, 0.0632381578, 0.0572428925,
+    0.0510534242, 0.0447468229, 0.038395995, 0.0320735368, 0.0258537721, 0.0198005183,
+    0.0139807863, 0.0084512448, 0.0032639979, -0.0015350359, -0.0059060082, -0.0098190256,
+    -0.0132507215, -0.0161875265, -0.0186164872, -0.0205446727, -0.0219739146, -0.0229204861,
+    -0.0234080863, -0.0234566315, -0.0231017777, -0.02237969, -0.0213300463, -0.0199924534,
+    -0.0184126992, -0.0166377699, -0.0147139428, -0.0126796776, -0.0105938331, -0.008473677,
+    -0.006384185, -0.0043466731, -0.0023956944, -0.000553518, 0.0011421469, 0.0026845693,
+    0.0040471369, 0.0052380201, 0.0062194591, 0.0070340085, 0.0076266453, 0.0080376628,
+    0.0083037666, 0.0083694798, 0.0082901022, 0.0080741359, 0.007754382, 0.0073260526,
+    0.0068163569, 0.0062325477, 0.0056078229, 0.0049516078, 0.0161380976])
+FATL_WEIGHTS = np.array([
+    0.436040945, 0.3658689069, 0.2460452079, 0.1104506886, -0.0054034585, -0.0760367731, -0.0933058722,
+    -0.0670110374, -0.0190795053, 0.0259609206, 0.0502044896, 0.0477818607, 0.0249252327, -0.0047706151,
+    -0.0272432537, -0.0338917071, -0.0244141482, -0.0055774838, 0.0128149838, 0.0226522218, 0.0208778257,
+    0.0100299086, -0.0036771622, -0.013674485, -0.0160483392, -0.0108597376, -0.0016060704, 0.0069480557,
+    0.0110573605, 0.0095711419, 0.0040444064, -0.0023824623, -0.0067093714, -0.00720034, -0.004771771,
+    0.0005541115, 0.000786016, 0.0130129076, 0.0040364019])
+
+# Shorter series are convolved directly, longer ones with overlap-add FFT convolution
+OA_MIN_SIZE = 4096
+
+
+def _kernel_matrix(kernels: list, normalize: bool = True) -> np.ndarray:
+    """Stack kernels into (n_kernels, max_taps) matrix, shorter kernels are padded with zero (older) taps"""
+    matrix = np.zeros((len(kernels), max(len(k) for k in kernels)))
+    for i, kernel in enumerate(kernels):
+        kernel = np.asarray(kernel, dtype=np.float64)
+        matrix[i, :kernel.shape[0]] = kernel / kernel.sum() if normalize else kernel
+    return matrix
+
+
+def fir_filter_bank(data, kernels: list, normalize: bool = True) -> np.ndarray:
+    """
+    Apply several causal FIR filters to the series in one batched pass:
+    y[t] = sum(w[j] * x[t - j]), the first weight is applied to the current bar.
+    Output is NaN, while the window of the kernel isn't full or contains NaN
+    :param data: series
+    :param kernels: list of weights
+    :param normalize: divide weights by their sum (as the adaptive trend lines do)
+    :return: matrix (n_kernels, n_bars)
+    """
+    x = np.asarray(data, dtype=np.float64)
+    n = x.shape[0]
+    weights = _kernel_matrix(kernels, normalize)
+    is_nan = np.isnan(x)
+    x = np.where(is_nan, 0, x)
+
+    if n >= OA_MIN_SIZE:
+        result = signal.oaconvolve(x[np.newaxis, :], weights, mode='full', axes=1)[:, :n]
+    else:
+        result = np.stack([np.convolve(x, w, mode='full')[:n] for w in weights])
+
+    # NaN inputs were replaced with zero, the windows with them (and not full windows) are NaN
+    nan_count = np.concatenate([[0], np.cumsum(is_nan)])
+    bars = np.arange(n)
+    for i, kernel in enumerate(kernels):
+        taps = len(kernel)
+        in_window = nan_count[bars + 1] - nan_count[np.maximum(bars + 1 - taps, 0)]
+        result[i, (bars < taps - 1) | (in_window > 0)] = np.nan
+    return result
+
+
+def fir_filter(data, weights, normalize: bool = True) -> np.ndarray:
+    """Apply one causal FIR filter (see fir_filter_bank)"""
+    return fir_filter_bank(data, [weights], normalize)[0]
+
+
+class FirBank:
+    """
+    Bank of causal FIR filters with batch (apply) and streaming (update) modes.
+    Streaming keeps the last max_taps values in a ring buffer, so a new bar costs O(taps) per filter
+    """
+
+    def __init__(self, kernels: dict, normalize: bool = True):
+        """
+        :param kernels: {name: weights}, e.g. {'satl': SATL_WEIGHTS, 'fatl': FATL_WEIGHTS}
+        """
+        self.names = list(kernels.keys())
+        self.kernels = list(kernels.values())
+        self.normalize = normalize
+        self.taps = np.array([len(k) for k in self.kernels])
+        # reversed weights: the latest value is the last in the window
+        self.weights = _kernel_matrix(self.kernels, normalize)[:, ::-1].copy()
+        self.reset()
+
+    def reset(self):
+        size = self.weights.shape[1]
+        # every value is written twice, so the last SIZE values are always a contiguous slice
+        self.buffer = np.zeros(2 * size)
+        self.nan_bars = np.full(size, False)
+        self.count = 0
+
+    def apply(self, data) -> dict:
+        """Filter the whole series: {name: filtered series}"""
+        return dict(zip(self.names, fir_filter_bank(data, self.kernels, self.normalize)))
+
+    def update(self, value: float) -> np.ndarray:
+        """Add the new bar and return the value of each filter on it (NaN, while the window isn't full)"""
+        size = self.weights.shape[1]
+        pos = self.count % size
+        is_nan = value != value
+        self.buffer[pos] = self.buffer[pos + size] = 0.0 if is_nan else value
+        self.nan_bars[pos] = is_nan
+        self.count += 1
+
+        start = pos + 1
+        result = self.weights @ self.buffer[start:start + size]
+        result[self.taps > self.count] = np.nan
+        if self.nan_bars.any():
+            # bars since each NaN, the filter is NaN while the NaN is inside its window
+            age = (pos - np.flatnonzero(self.nan_bars)) % size
+            result[self.taps > age.min()] = np.nan
+        return result
+
+
+class SosFilter:
+    """
+    Causal IIR filter in second-order sections form, which keeps its state between calls,
+    so new data can be filtered in chunks (filter) or bar by bar (update) without recomputing the history
+    """
+
+    def __init__(self, sos: np.ndarray):
+        self.sos = np.asarray(sos, dtype=np.float64)
+        self.zi = None
+
+    def reset(self, x0: float = None):
+        """Reset the state. If x0 is set, the filter starts in steady state for constant input x0"""
+        self.zi = None if x0 is None else signal.sosfilt_zi(self.sos) * x0
+
+    def filter(self, data) -> np.ndarray:
+        """Filter the next chunk of data, the state is started from the first value"""
+        x = np.asarray(data, dtype=np.float64)
+        if x.shape[0] == 0:
+            return x
+        if self.zi is None:
+            self.reset(x[0])
+        y, self.zi = signal.sosfilt(self.sos, x, zi=self.zi)
+        return y
+
+    def update(self, value: float) -> float:
+        """Filter one bar (transposed direct form II, the same state as scipy.signal.sosfilt)"""
+        if self.zi is None:
+            self.reset(value)
+        x = value
+        for (b0, b1, b2, _, a1, a2), z in zip(self.sos, self.zi):
+            y = b0 * x + z[0]
+            z[0] = b1 * x - a1 * y + z[1]
+            z[1] = b2 * x - a2 * y
+            x = y
+        return x
+
+
+def lowpass(cutoff_frequency: float, sampling_frequency: float, order: int = 4) -> SosFilter:
+    """Causal Butterworth low-pass filter"""
+    sos = signal.butter(order, cutoff_frequency / (0.5 * sampling_frequency), btype='low', output='sos')
+    return SosFilter(sos)
@@ -0,0 +1,174 @@
+import io
+import ast
+import sys
+import tokenize
+from functools import lru_cache
+from typing import Literal
+import numpy as np
+import pandas as pd
+try:
+    import numexpr as ne
+except ImportError:
+    ne = None
+
+
+FUNCTIONS = {'abs': np.abs, 'sqrt': np.sqrt, 'log': np.log, 'exp': np.exp}
+_BIN_OPS = {ast.Add: '+', ast.Sub: '-', ast.Mult: '*', ast.Div: '/', ast.Pow: '**', ast.Mod: '%'}
+_BOOLEANS = {'&': 'and', '|': 'or'}
+_COMPARE_OPS = {ast.Lt: '<', ast.LtE: '<=', ast.Gt: '>', ast.GtE: '>=', ast.Eq: '==', ast.NotEq: '!='}
+
+
+def _to_source(node, names: set) -> str:
+    """Translate python expression into numexpr/numpy syntax: and/or/not -> &, |, ~, chained comparisons are split"""
+    if isinstance(node, ast.Expression):
+        return _to_source(node.body, names)
+    if isinstance(node, ast.BoolOp):
+        op = ' & ' if isinstance(node.op, ast.And) else ' | '
+        return op.join(f'({_to_source(value, names)})' for value in node.values)
+    if isinstance(node, ast.UnaryOp):
+        operand = _to_source(node.operand, names)
+        if isinstance(node.op, (ast.Not, ast.Invert)):
+            return f'~({operand})'
+        if isinstance(node.op, ast.USub):
+            return f'-({operand})'
+        if isinstance(node.op, ast.UAdd):
+            return operand
+    if isinstance(node, ast.BinOp) and type(node.op) in _BIN_OPS:
+        return f'({_to_source(node.left, names)}) {_BIN_OPS[type(node.op)]} ({_to_source(node.right, names)})'
+    if isinstance(node, ast.Compare) and all(type(op) in _COMPARE_OPS for op in node.ops):
+        operands = [_to_source(node.left, names)] + [_to_source(c, names) for c in node.comparators]
+        return ' & '.join(f'(({operands[i]}) {_COMPARE_OPS[type(op)]} ({operands[i + 1]}))'
+                          for i, op in enumerate(node.ops))
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in FUNCTIONS \
+            and not node.keywords and len(node.args) == 1:
+        return f'{node.func.id}({_to_source(node.args[0], names)})'
+    if isinstance(node, ast.Name):
+        names.add(node.id)
+        return node.id
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, bool)):
+        return repr(node.value)
+    raise ValueError(f'Unsupported filter expression: {ast.unparse(node)}')
+
+
+def _replace_booleans(expression: str) -> str:
+    """As pd.DataFrame.query does, & and | are 'and' and 'or', so they bind looser than comparisons"""
+    tokens = tokenize.generate_tokens(io.StringIO(expression.strip()).readline)
+    return tokenize.untokenize((tokenize.NAME, _BOOLEANS[token.string])
+                               if token.type == tokenize.OP and token.string in _BOOLEANS
+                               else (token.type, token.string)
+                               for token in tokens)
+
+
+@lru_cache(maxsize=1024)
+def compile_expression(expression: str):
+    """
+    Parse filter expression once
+    :return: (source in numexpr syntax, column names, compiled code for numpy)
+    :raise ValueError, SyntaxError: the expression can't be translated (strings, 'in', @variables, ...)
+    """
+    names = set()
+    source = _to_source(ast.parse(_replace_booleans(expression), mode='eval'), names)
+    return source, tuple(sorted(names)), compile(source, '<filter>', 'eval')
+
+
+def _evaluate(source: str, code, columns: dict):
+    if ne is not None:
+        try:
+            return ne.evaluate(source, local_dict=columns)
+        except (KeyError, TypeError, ValueError, NotImplementedError):
+            pass
+    return eval(code, {'__builtins__': {}, **FUNCTIONS}, columns)
+
+
+class FilterBuilder:
+    """
+    Evaluates filter expressions (the same syntax as pd.DataFrame.query: "fatr < satr and mfi > 50")
+    directly into boolean masks with numexpr (if installed) or numpy, rows aren't copied.
+    Expressions, which can't be translated (strings, 'in', @variables, ...), are evaluated by pd.DataFrame.eval.
+    Masks of the expressions are cached, so stacking many filters on the same data is cheap
+    """
+
+    def __init__(self, data: pd.DataFrame | dict, local_dict: dict = None):
+        """
+        :param data: pd.DataFrame or dict {column: np.array} (e.g. data_loader.load_arrays)
+        :param local_dict: variables for @name in expressions
+        """
+        self.data = data
+        self.local_dict = local_dict or {}
+        self.columns = {}
+        self.masks = {}
+
+    def __column(self, name: str) -> np.ndarray:
+        if name not in self.columns:
+            if name not in self.data:
+                raise KeyError(f"Column '{name}' is not found in data")
+            self.columns[name] = np.asarray(self.data[name])
+        return self.columns[name]
+
+    def __len(self) -> int:
+        if isinstance(self.data, pd.DataFrame):
+            return self.data.shape[0]
+        return len(next(iter(v for v in self.data.values() if isinstance(v, np.ndarray))))
+
+    def __eval(self, expression: str) -> np.ndarray:
+        if not isinstance(self.data, pd.DataFrame):
+            raise ValueError(f'Unsupported filter expression for dict data: {expression}')
+        return np.asarray(self.data.eval(expression, local_dict=self.local_dict, global_dict={}))
+
+    def mask(self, expression: str) -> np.ndarray:
+        """Return boolean mask of the expression"""
+        if expression not in self.masks:
+            try:
+                source, names, code = compile_expression(expression)
+                result = _evaluate(source, code, {name: self.__column(name) for name in names})
+            except (ValueError, SyntaxError, KeyError, tokenize.TokenError):
+                result = self.__eval(expression)
+            self.masks[expression] = np.broadcast_to(np.asarray(result, dtype=bool), (self.__len(),))
+        return self.masks[expression]
+
+    def build(self, *expressions: str, how: Literal['and', 'or'] = 'and') -> np.ndarray:
+        """
+        Combine masks of the expressions with AND or OR
+        :return: int8 filter vector for TradeTester.add_filters: 1 - condition is True, 0 - otherwise
+        """
+        if how not in ('and', 'or'):
+            raise ValueError("Choose either 'and' or 'or'")
+        if not expressions:
+            raise ValueError("At least one expression must be provided")
+        combine = np.logical_and if how == 'and' else np.logical_or
+        result = self.mask(expressions[0]).copy()
+        for expression in expressions[1:]:
+            combine(result, self.mask(expression), out=result)
+        return result.view(np.int8)
+
+
+def build_filter(data: pd.DataFrame | dict, *expressions: str, how: Literal['and', 'or'] = 'and',
+                 local_dict: dict = None) -> np.ndarray:
+    """
+    Return int8 filter vector (1 - True, 0 - False) of the expressions combined with AND or OR.
+    @variables are taken from local_dict, by default from the caller's variables (as in pd.DataFrame.query)
+    """
+    if local_dict is None:
+        frame = sys._getframe(1)
+        local_dict = {**frame.f_globals, **frame.f_locals}
+    return FilterBuilder(data, local_dict).build(*expressions, how=how)
+
+
+if __name__ == '__main__':
+    # check, that masks are the same as pd.DataFrame.query returns
+    from utils import random_walk_ohlc
+    import talib as ta
+
+    df = random_walk_ohlc(10_000)
+    df['fatr'] = ta.ATR(df['high'], df['low'], df['close'], 12)
+    df['satr'] = ta.ATR(df['high'], df['low'], df['close'], 24)
+    df['mfi'] = ta.MFI(df['high'], df['low'], df['close'], df['volume'], 21)
+    level = 50
+    expressions = ('fatr < satr', 'fatr < satr & mfi > 50', 'mfi > 30 and mfi < 70', '30 < mfi < 70',
+                   '~(fatr < satr) | mfi > 80', 'not mfi > 50 or abs(close - open) > fatr',
+                   'mfi > @level', 'volume in [100, 200, 300]')
+    for expression in expressions:
+        expected = df.index.isin(df.query(expression).index)
+        result = build_filter(df, expression).astype(bool)
+        assert np.array_equal(result, expected), expression
+        print(f'{expression:<45} OK ({result.sum()} rows)')
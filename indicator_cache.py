@@ -0,0 +1,300 @@
+import os
+import pickle
+import hashlib
+import weakref
+import functools
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import talib
+
+
+CACHE_DIR = '.indicator_cache'
+MAX_BYTES = 256 * 2 ** 20
+# Values, which are checked to detect an array changed in place
+SAMPLE_SIZE = 1024
+
+# id of memory owner array -> (weakref to it, {view: (sample, digest)})
+_digests = {}
+
+
+def _root(array: np.ndarray) -> np.ndarray:
+    """Array, which owns the memory of the view (pandas returns a new view of its block on every .values)"""
+    while isinstance(array.base, np.ndarray):
+        array = array.base
+    return array
+
+
+def _sample(array: np.ndarray) -> bytes:
+    """SAMPLE_SIZE values spread over the array, including the first and the last ones"""
+    idx = np.linspace(0, array.size - 1, min(SAMPLE_SIZE, array.size)).astype(np.int64)
+    sample = array.flat[idx]
+    if array.dtype.kind == 'O':
+        return pd.util.hash_array(sample).tobytes()
+    return sample.tobytes()
+
+
+def _digest(array: np.ndarray) -> bytes:
+    """Hash of all values of the array"""
+    h = hashlib.blake2b(digest_size=16)
+    flat = np.ascontiguousarray(array).ravel()
+    if array.dtype.kind in 'fiub':
+        h.update(memoryview(flat))
+    elif array.dtype.kind in 'mM':
+        h.update(memoryview(flat.view(np.int64)))
+    else:
+        h.update(pd.util.hash_array(flat).tobytes())
+    return h.digest()
+
+
+def _forget(root_id: int):
+    _digests.pop(root_id, None)
+
+
+def _array_fingerprint(array: np.ndarray, h):
+    """
+    Shape, dtype and hash of all values of the array.
+    The hash is computed once per array: it's kept, while the memory owner of the array is alive,
+    and reused, while the sample of the values is the same (it's recomputed, if the array is changed in place)
+    """
+    array = np.asarray(array)
+    h.update(f'{array.shape}{array.dtype.str}'.encode())
+    if array.size == 0:
+        return
+    root = _root(array)
+    view = (array.__array_interface__['data'][0], array.shape, array.strides, array.dtype.str)
+    sample = _sample(array)
+    ref, views = _digests.get(id(root), (None, None))
+    if ref is None or ref() is not root:
+        ref, views = weakref.ref(root, lambda _, root_id=id(root): _forget(root_id)), {}
+        _digests[id(root)] = (ref, views)
+    if view not in views or views[view][0] != sample:
+        views[view] = (sample, _digest(array))
+    h.update(views[view][1])
+
+
+def _update(h, value):
+    if isinstance(value, pd.DataFrame):
+        h.update(f'df{list(value.columns)}'.encode())
+        _array_fingerprint(value.index.values, h)
+        for column in value.columns:
+            _array_fingerprint(value[column].values, h)
+    elif isinstance(value, pd.Series):
+        h.update(b'series')
+        _array_fingerprint(value.index.values, h)
+        _array_fingerprint(value.values, h)
+    elif isinstance(value, np.ndarray):
+        h.update(b'array')
+        _array_fingerprint(value, h)
+    elif isinstance(value, (list, tuple)):
+        h.update(f'{type(value).__name__}{len(value)}'.encode())
+        for item in value:
+            _update(h, item)
+    elif isinstance(value, dict):
+        h.update(b'dict')
+        for key in sorted(value):
+            _update(h, key)
+            _update(h, value[key])
+    else:
+        h.update(repr(value).encode())
+    h.update(b'|')
+
+
+def fingerprint(*values) -> str:
+    """Fingerprint of the values. Arrays are hashed by shape, dtype and all their values (see _array_fingerprint)"""
+    h = hashlib.blake2b(digest_size=16)
+    for value in values:
+        _update(h, value)
+    return h.hexdigest()
+
+
+def _nbytes(value) -> int:
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=False))
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=False).sum())
+    if isinstance(value, (list, tuple)):
+        return sum(_nbytes(item) for item in value)
+    return 64
+
+
+def _read_only(value):
+    """Cached arrays are shared between callers, so they can't be changed in place"""
+    if isinstance(value, np.ndarray) and value.flags.owndata:
+        value.flags.writeable = False
+    elif isinstance(value, (pd.Series, pd.DataFrame)):
+        # .values are views of the pandas blocks, so the blocks are made read only
+        columns = [value] if isinstance(value, pd.Series) else [value.iloc[:, i] for i in range(value.shape[1])]
+        for column in columns:
+            array = column.values
+            while isinstance(array, np.ndarray):
+                array.flags.writeable = False
+                array = array.base
+    elif isinstance(value, tuple):
+        for item in value:
+            _read_only(item)
+    return value
+
+
+class IndicatorCache:
+    """
+    Memoizes indicator results by function name, parameters and fingerprint of input data.
+    Memory tier is LRU bounded by max_bytes, optional disk tier (cache_dir) shares results between processes
+    """
+
+    def __init__(self, max_bytes: int = MAX_BYTES, cache_dir: str = None):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def key(self, func, args: tuple, kwargs: dict) -> str:
+        name = f'{getattr(func, "__module__", "")}.{getattr(func, "__qualname__", getattr(func, "__name__", repr(func)))}'
+        return fingerprint(name, args, kwargs)
+
+    def __disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f'{key}.pkl')
+
+    def __load(self, key: str):
+        try:
+            with open(self.__disk_path(key), 'rb') as f:
+                return True, pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return False, None
+
+    def __dump(self, key: str, value):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # write into temporary file and then replace, so other processes never read half written file
+        tmp_path = f'{self.__disk_path(key)}.tmp{os.getpid()}'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.__disk_path(key))
+
+    def __put(self, key: str, value):
+        nbytes = _nbytes(value)
+        if nbytes > self.max_bytes:
+            return
+        self.entries[key] = (value, nbytes)
+        self.size += nbytes
+        while self.size > self.max_bytes:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.size -= evicted
+
+    def call(self, func, *args, **kwargs):
+        """Return func(*args, **kwargs), computing it only if the same call isn't cached"""
+        key = self.key(func, args, kwargs)
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key][0]
+
+        found = False
+        if self.cache_dir is not None:
+            found, value = self.__load(key)
+            self.disk_hits += found
+        if not found:
+            self.misses += 1
+            value = func(*args, **kwargs)
+            if self.cache_dir is not None:
+                self.__dump(key, value)
+        value = _read_only(value)
+        self.__put(key, value)
+        return value
+
+    def cached(self, func):
+        """Decorator: memoize func in this cache"""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return self.call(func, *args, **kwargs)
+        return wrapper
+
+    def clear(self, disk: bool = False):
+        self.entries.clear()
+        # arrays changed in place outside the sample are hashed again
+        _digests.clear()
+        self.size = 0
+        if disk and self.cache_dir is not None and os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.pkl'):
+                    os.remove(os.path.join(self.cache_dir, name))
+
+    def stats(self) -> dict:
+        return {'entries': len(self.entries), 'bytes': self.size,
+                'hits': self.hits, 'disk hits': self.disk_hits, 'misses': self.misses}
+
+
+_TALIB_FUNCTIONS = frozenset(talib.get_functions())
+
+
+class CachedTalib:
+    """
+    Drop-in replacement of talib module, which functions are memoized:
+    ta = CachedTalib(); ta.SMA(close, 42)
+    """
+
+    def __init__(self, cache: IndicatorCache = None):
+        self.cache = cache or default_cache
+
+    def __getattr__(self, name: str):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        attr = getattr(talib, name)
+        # only indicators are memoized, constants (MA_Type) and settings (set_unstable_period) are talib's own
+        if name not in _TALIB_FUNCTIONS:
+            return attr
+        func = self.cache.cached(attr)
+        setattr(self, name, func)
+        return func
+
+
+default_cache = IndicatorCache()
+cached = default_cache.cached
+
+
+if __name__ == '__main__':
+    # check cached talib on pd.Series inputs and compare the time of a cache hit with recomputing
+    import sys
+    from time import perf_counter
+    from utils import random_walk_ohlc
+
+    df = random_walk_ohlc(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
+    ta = CachedTalib(IndicatorCache(max_bytes=2 ** 30))
+    assert ta.MA_Type is talib.MA_Type and ta.MA_Type.SMA == talib.MA_Type.SMA
+    calls = {'SMA': lambda lib: lib.SMA(df['close'], 42),
+             'TYPPRICE SMA': lambda lib: lib.SMA(lib.TYPPRICE(df['high'], df['low'], df['close']), 42),
+             'ATR': lambda lib: lib.ATR(df['high'], df['low'], df['close'], 42),
+             'MFI': lambda lib: lib.MFI(df['high'], df['low'], df['close'], df['volume'], 42),
+             'BBANDS': lambda lib: lib.BBANDS(df['close'], 42, 2, 2, ta.MA_Type.EMA)}
+    for name, call in calls.items():
+        times = {}
+        for label, lib in (('recompute', talib), ('first call', ta), ('cache hit', ta)):
+            start = perf_counter()
+            result = call(lib)
+            times[label] = perf_counter() - start
+        expected = call(talib)
+        for value, expected_value in zip(result if isinstance(result, tuple) else (result,),
+                                         expected if isinstance(expected, tuple) else (expected,)):
+            assert isinstance(value, pd.Series)
+            pd.testing.assert_series_equal(value, expected_value)
+            try:
+                value.iloc[-1] = 0
+                raise AssertionError('cached result is writeable')
+            except ValueError:
+                pass
+        assert call(ta) is result, name
+        print(f'{name:<14}' + ''.join(f' | {label} {seconds:.4f} s' for label, seconds in times.items())
+              + f' | hit is {times["recompute"] / times["cache hit"]:.1f}x faster')
+
+    # input changed in place is hashed again
+    close = df['close'].values.copy()
+    first = ta.SMA(close, 42)
+    close[-1] += 1
+    assert ta.SMA(close, 42) is not first
+    close[len(close) // 3:] *= 1.01
+    assert np.array_equal(ta.SMA(close, 42), talib.SMA(close, 42), equal_nan=True)
+    print(ta.cache.stats())
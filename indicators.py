@@ -1,5 +1,7 @@
 from typing import Literal
 from candlestick_patterns import impulse_candles
+from filter_bank import SATL_WEIGHTS, FATL_WEIGHTS, fir_filter, lowpass
+from multi_timeframe import higher_timeframe_trend
 from scipy import signal
 import talib as ta
 import numpy as np
@@ -13,56 +15,78 @@ def donchian_channel(high: pd.Series, low: pd.Series, period: int = 21):
     return upper.values, middle.values, lower.values
 
 
+# Latch-style trends are state machines with 3 states (-1, 0, 1).
+# Each bar is encoded as its transition: the next state for every current state, packed into one code.
+# Then the trend of the whole series is a prefix composition of these codes, which is done
+# with log2(n) vectorized steps instead of a python loop over bars.
+def _pack_transition(to_dn, to_flat, to_up):
+    """Pack next states for current states -1, 0 and 1 into the transition code (0..26)"""
+    return (np.asarray(to_dn) + 1) * 9 + (np.asarray(to_flat) + 1) * 3 + (np.asarray(to_up) + 1)
+
+
+_APPLY = np.array([[code // 9, code // 3 % 3, code % 3] for code in range(27)], dtype=np.int8) - 1
+_COMPOSE = np.array([[_pack_transition(*_APPLY[g][_APPLY[f] + 1]) for f in range(27)] for g in range(27)],
+                    dtype=np.uint8)
+_IDENTITY = _pack_transition(-1, 0, 1)
+
+
+def latch_states(to_dn: np.ndarray, to_flat: np.ndarray, to_up: np.ndarray, initial: int = 0) -> np.ndarray:
+    """
+    Run 3-state machine over the bars without python loop
+    :param to_dn: next state on each bar if current state is -1
+    :param to_flat: next state on each bar if current state is 0
+    :param to_up: next state on each bar if current state is 1
+    :param initial: state before the first bar
+    :return: np.array with the state after each bar
+    """
+    codes = _pack_transition(to_dn, to_flat, to_up).astype(np.uint8)
+    # bars, that don't change the state, are skipped
+    events = np.flatnonzero(codes != _IDENTITY)
+    if events.shape[0] == 0:
+        return np.full(codes.shape[0], initial)
+    scan = codes[events]
+
+    offset = 1
+    while offset < scan.shape[0]:
+        scan[offset:] = _COMPOSE[scan[offset:], scan[:-offset]]
+        offset *= 2
+
+    # forward fill states from the last event bar
+    last_event = np.full(codes.shape[0], -1)
+    last_event[events] = np.arange(events.shape[0])
+    np.maximum.accumulate(last_event, out=last_event)
+    event_states = _APPLY[scan, initial + 1]
+    return np.where(last_event >= 0, event_states[last_event], initial).astype(int)
+
+
 def channel_trend(high: pd.Series, low: pd.Series, period: int = 24):
     hi = high.values
     lo = low.values
 
     hi_channel, mi_channel, lo_channel = donchian_channel(high, low, period)
 
-    flag = 0
-    trend = []
-
-    for i in range(len(hi)):
-        if flag != 1 and hi[i] >= hi_channel[i]:
-            if lo[i] > mi_channel[i]:
-                flag = 1
-            else:
-                flag = 0
-
-        elif flag != -1 and lo[i] <= lo_channel[i]:
-            if hi[i] < mi_channel[i]:
-                flag = -1
-            else:
-                flag = 0
-
-        trend.append(flag)
+    # channel border is touched and the bar is on the right side of the middle line
+    up_touch = hi >= hi_channel
+    dn_touch = lo <= lo_channel
+    up_value = np.where(lo > mi_channel, 1, 0)
+    dn_value = np.where(hi < mi_channel, -1, 0)
 
-    return np.array(trend)
+    # uptrend ignores upper touches, downtrend ignores lower touches
+    to_up = np.where(dn_touch, dn_value, 1)
+    to_dn = np.where(up_touch, up_value, -1)
+    to_flat = np.where(up_touch, up_value, np.where(dn_touch, dn_value, 0))
+    return latch_states(to_dn, to_flat, to_up)
 
 def trend_based_on_impulse_candles(op: np.ndarray, hi: np.ndarray, lo: np.ndarray, cl: np.ndarray, period: int = 21, n_split: int = 3):
     imp = impulse_candles(op, hi, lo, cl, period, n_split)
-    flag = 0
+    # the level is never updated, so the trend is reset by the first ordinary candle closed on the other side of 0
     current_level = 0
-    trend = []
-
-    for i in range(len(op)):
-        if imp[i] == 1:  # if current candle is impulse
-            current_level == lo[i]
-            flag = 1
-        elif imp[i] == -1:
-            current_level == hi[i]
-            flag = -1
-        else:
-            if flag == 1 and cl[i] < current_level and imp[i] == -1:
-                flag = -1
-            elif flag == -1 and cl[i] > current_level and imp[i] == 1:
-                flag = 1
-            elif flag == 1 and cl[i] < current_level:
-                flag = 0
-            elif flag == -1 and cl[i] > current_level:
-                flag = 0
-        trend.append(flag)
-    return trend
+    cl = np.asarray(cl)
+
+    to_up = np.where(imp == 1, 1, np.where(imp == -1, -1, np.where(cl < current_level, 0, 1)))
+    to_dn = np.where(imp == 1, 1, np.where(imp == -1, -1, np.where(cl > current_level, 0, -1)))
+    to_flat = np.where(imp == 1, 1, np.where(imp == -1, -1, 0))
+    return latch_states(to_dn, to_flat, to_up)
 
 def trend_based_on_ma(ma: pd.Series, method: Literal['slope', 'position'], price: pd.Series):
     if method == 'slope':
@@ -75,7 +99,13 @@ def trend_based_on_ma(ma: pd.Series, method: Literal['slope', 'position'], price
                                     0))
 
 def trend_on_sessions(dt_data: pd.Series, close: pd.Series, session_hour: int = 9):
-    close.resample('1h')
+    """
+    Trend of completed sessions (days, that start at session_hour):
+    1 - the last completed session closed higher than the previous one, -1 - lower, 0 - the same
+    """
+    close = np.asarray(close)
+    df = pd.DataFrame({'dt': np.asarray(dt_data), 'open': close, 'high': close, 'low': close, 'close': close})
+    return higher_timeframe_trend(df, '1D', lambda sessions: ma_trend(sessions['close'], 1), offset=f'{session_hour}h')
 
 def chande_kroll_stop(high: pd.Series, low: pd.Series, close: pd.Series, p: int = 10, x: int = 1, q: int = 9):
     atr = ta.ATR(high, low, close, p)
@@ -89,19 +119,13 @@ def chande_kroll_stop(high: pd.Series, low: pd.Series, close: pd.Series, p: int
 
 def chande_kroll_stop_trend(op: np.ndarray, hi: np.ndarray, lo: np.ndarray, cl: np.ndarray, p: int = 10, x: int = 1, q: int = 9):
     upper, lower = chande_kroll_stop(hi, lo, cl, p, x, q)
-    flag = 0
-    trend = []
-
-    for i in range(len(hi)):
-        if flag != 1 and hi[i] >= upper[i]:
-            flag = 1
+    up_touch = np.asarray(hi) >= np.asarray(upper)
+    dn_touch = np.asarray(lo) <= np.asarray(lower)
 
-        elif flag != -1 and lo[i] <= lower[i]:
-            flag = -1
-
-        trend.append(flag)
-
-    return np.array(trend)
+    to_up = np.where(dn_touch, -1, 1)
+    to_dn = np.where(up_touch, 1, -1)
+    to_flat = np.where(up_touch, 1, np.where(dn_touch, -1, 0))
+    return latch_states(to_dn, to_flat, to_up)
 
 
 def level_crossover(current: pd.Series, level: int = 50) -> np.array:
@@ -162,35 +186,20 @@ def ma_trend(ma, thresh: int = 1):
 
 
 def slow_adaptive_trend_line(data):
-    weights = np.array([0.0982862174, 0.0975682269, 0.0961401078, 0.0940230544, 0.091243709, 0.0878391006, 
-                        0.0838544303, 0.079340635, 0.0743569346, 0.0689666682, 0.0632381578, 0.0572428925, 
-                        0.0510534242, 0.0447468229, 0.038395995, 0.0320735368, 0.0258537721, 0.0198005183, 
-                        0.0139807863, 0.0084512448, 0.0032639979, -0.0015350359, -0.0059060082, -0.0098190256, 
-                        -0.0132507215, -0.0161875265, -0.0186164872, -0.0205446727, -0.0219739146, -0.0229204861, 
-                        -0.0234080863, -0.0234566315, -0.0231017777, -0.02237969, -0.0213300463, -0.0199924534, 
-                        -0.0184126992, -0.0166377699, -0.0147139428, -0.0126796776, -0.0105938331, -0.008473677, 
-                        -0.006384185, -0.0043466731, -0.0023956944, -0.000553518, 0.0011421469, 0.0026845693, 
-                        0.0040471369, 0.0052380201, 0.0062194591, 0.0070340085, 0.0076266453, 0.0080376628, 
-                        0.0083037666, 0.0083694798, 0.0082901022, 0.0080741359, 0.007754382, 0.0073260526, 
-                        0.0068163569, 0.0062325477, 0.0056078229, 0.0049516078, 0.0161380976])
-    weighted_avg = np.convolve(data, weights, mode='valid') / np.sum(weights)
-    weighted_avg = np.insert(weighted_avg, 0, np.repeat(np.nan, len(weights)-1))
-    return weighted_avg
+    return fir_filter(data, SATL_WEIGHTS)
 
 def fast_adaptive_trend_line(data):
-    weights = np.array([0.436040945, 0.3658689069, 0.2460452079, 0.1104506886, -0.0054034585, -0.0760367731, -0.0933058722,
-                        -0.0670110374, -0.0190795053, 0.0259609206, 0.0502044896, 0.0477818607, 0.0249252327, -0.0047706151,
-                        -0.0272432537, -0.0338917071, -0.0244141482, -0.0055774838, 0.0128149838, 0.0226522218, 0.0208778257, 
-                        0.0100299086, -0.0036771622, -0.013674485, -0.0160483392, -0.0108597376, -0.0016060704, 0.0069480557, 
-                        0.0110573605, 0.0095711419, 0.0040444064, -0.0023824623, -0.0067093714, -0.00720034, -0.004771771, 
-                        0.0005541115, 0.000786016, 0.0130129076, 0.0040364019])
-    weighted_avg = np.convolve(data, weights, mode='valid') / np.sum(weights)
-    weighted_avg = np.insert(weighted_avg, 0, np.repeat(np.nan, len(weights)-1))
-    return weighted_avg
-
-def apply_lowpass_filter(data, cutoff_frequency, sampling_frequency):
+    return fir_filter(data, FATL_WEIGHTS)
+
+def apply_lowpass_filter(data, cutoff_frequency, sampling_frequency, causal: bool = True):
+    """
+    Butterworth low-pass filter of 4th order.
+    causal: filter only with past values (for backtests), otherwise filtfilt is used, which looks into the future
+    """
+    if causal:
+        return lowpass(cutoff_frequency, sampling_frequency, 4).filter(data)
     nyquist_frequency = 0.5 * sampling_frequency
     normalized_cutoff = cutoff_frequency / nyquist_frequency
     b, a = signal.butter(4, normalized_cutoff, btype='low', analog=False)
     filtered_data = signal.filtfilt(b, a, data)
-    return filtered_data
\ No newline at end of file
+    return filtered_data
@@ -0,0 +1,60 @@
+from data_loader import load_arrays
+from fill_engine import first_touch, first_exit
+from order_book import BUY, SL, TP
+import numpy as np
+
+
+class IntrabarData:
+    """
+    Lower timeframe data (e.g. M1), which is used to resolve bars, where the order of events is unknown.
+    Data is memory-mapped from the binary cache of data_loader and found by binary search on time,
+    so only the minutes of requested bars are read from disk
+    """
+
+    def __init__(self, path: str, dt_column: str = 'dt', cache_dir: str = None):
+        arrays = load_arrays(path, dt_column, cache_dir, mmap=True)
+        self.dt = arrays[dt_column]
+        self.hi = arrays['high']
+        self.lo = arrays['low']
+        self.bars_resolved = 0
+
+    def bars(self, start: int, end: int):
+        """
+        Return high and low data of lower timeframe bars in [start, end)
+        start, end: epoch time in ns (UTC)
+        """
+        begin, finish = np.searchsorted(self.dt, [start, end])
+        return np.asarray(self.hi[begin:finish]), np.asarray(self.lo[begin:finish])
+
+    def __exit_status(self, hi: np.ndarray, lo: np.ndarray, begin: int, sl: float, tp: float, direction: int):
+        exit_idx = first_exit(hi, lo, begin, sl, tp, direction)
+        if exit_idx == -1:
+            return None
+        if (direction == BUY and lo[exit_idx] <= sl) or (direction != BUY and hi[exit_idx] >= sl):
+            return SL
+        return TP
+
+    def resolve_exit(self, start: int, end: int, sl: float, tp: float, direction: int):
+        """
+        Return which level (SL or TP code) is touched first inside the bar [start, end).
+        If both are touched by the same lower timeframe bar or there is no data, SL is returned
+        """
+        self.bars_resolved += 1
+        hi, lo = self.bars(start, end)
+        status = self.__exit_status(hi, lo, 0, sl, tp, direction)
+        return SL if status is None else status
+
+    def resolve_entry_exit(self, start: int, end: int, open_price: float, sl: float, tp: float, direction: int):
+        """
+        Return SL or TP code, if the order is closed inside the same bar [start, end), where it's opened.
+        None if it isn't closed in this bar (or there is no data)
+        """
+        self.bars_resolved += 1
+        hi, lo = self.bars(start, end)
+        if direction == BUY:
+            entry_idx = first_touch(hi, 0, open_price, 1)
+        else:
+            entry_idx = first_touch(lo, 0, open_price, -1)
+        if entry_idx == -1:
+            return None
+        return self.__exit_status(hi, lo, entry_idx + 1, sl, tp, direction)
@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+
+
+def true_range(hi: np.ndarray, lo: np.ndarray, cl: np.ndarray) -> np.ndarray:
+    """Return true range of each bar. The first bar has no previous close, so it is NaN"""
+    prev_cl = np.empty_like(cl, dtype=float)
+    prev_cl[0] = np.nan
+    prev_cl[1:] = cl[:-1]
+    return np.maximum(hi - lo, np.maximum(np.abs(hi - prev_cl), np.abs(lo - prev_cl)))
+
+
+def prior_atr(hi: np.ndarray, lo: np.ndarray, cl: np.ndarray, period: int) -> np.ndarray:
+    """
+    Return ATR of the PERIOD bars before each bar (the bar itself is excluded).
+    It's the same value as ta.ATR(hi[idx-period-1:idx], lo[...], cl[...], period)[-1]
+    :return: np.array, NaN where there is not enough history
+    """
+    tr = true_range(hi, lo, cl)
+    tr[0] = 0
+    cumsum = np.zeros(tr.shape[0] + 1)
+    np.cumsum(tr, out=cumsum[1:])
+
+    atr = np.full(tr.shape[0], np.nan)
+    atr[period + 1:] = (cumsum[period + 1:-1] - cumsum[1:-period - 1]) / period
+    return atr
+
+
+def prior_lowest(lo: np.ndarray, period: int) -> np.ndarray:
+    """Return lowest value for PERIOD bars before each bar. Same as lowest_value(lo[:idx], period)"""
+    return pd.Series(lo).rolling(period, min_periods=1).min().shift(1).values
+
+
+def prior_highest(hi: np.ndarray, period: int) -> np.ndarray:
+    """Return highest value for PERIOD bars before each bar. Same as highest_value(hi[:idx], period)"""
+    return pd.Series(hi).rolling(period, min_periods=1).max().shift(1).values
+
+
+def stoploss_levels(hi: np.ndarray, lo: np.ndarray, cl: np.ndarray,
+                    method: str, value: int | float, mult: int | float,
+                    points: float, indent: float):
+    """
+    Return stop loss levels for each bar for buy and sell orders
+    :param method: 'fixed', 'percent', 'bar_extremum', 'atr' or 'channel'
+    :param value: pips for 'fixed', percent for 'percent', period for 'atr' and 'channel'
+    :param mult: ATR multiplier
+    :return: (buy_levels, sell_levels)
+    """
+    if method == 'fixed':
+        return cl - value * points, cl + value * points
+
+    elif method == 'percent':
+        return lo - (cl * value / 100), hi + (cl * value / 100)
+
+    elif method == 'bar_extremum':
+        return lo - indent, hi + indent
+
+    elif method == 'atr':
+        atr = prior_atr(hi, lo, cl, value)
+        return lo - atr * mult, hi + atr * mult
+
+    elif method == 'channel':
+        return prior_lowest(lo, value), prior_highest(hi, value)
+
+    raise ValueError(f"Unknown stop loss method: {method}")
+
+
+def takeprofit_levels(hi: np.ndarray, lo: np.ndarray, cl: np.ndarray,
+                      method: str, value: int | float, mult: int | float,
+                      points: float, sl_levels: tuple = None):
+    """
+    Return take profit levels for each bar for buy and sell orders
+    :param method: 'fixed', 'atr', 'channel' or 'SL ratio'
+    :param value: pips for 'fixed', period for 'atr' and 'channel', ratio for 'SL ratio'
+    :param mult: ATR multiplier
+    :param sl_levels: (buy_levels, sell_levels) of stop loss, required for 'SL ratio'
+    :return: (buy_levels, sell_levels)
+    """
+    if method == 'fixed':
+        return hi + value * points, lo - value * points
+
+    elif method == 'atr':
+        atr = prior_atr(hi, lo, cl, value)
+        return hi + atr * mult, lo - atr * mult
+
+    elif method == 'channel':
+        return prior_highest(hi, value), prior_lowest(lo, value)
+
+    elif method == 'SL ratio':
+        if sl_levels is None:
+            raise ValueError("'SL ratio' method requires stop loss levels")
+        buy_sl, sell_sl = sl_levels
+        return lo - np.abs(lo - buy_sl) * value, lo - np.abs(lo - sell_sl) * value
+
+    raise ValueError(f"Unknown take profit method: {method}")
@@ -0,0 +1,87 @@
+from typing import Literal
+import numpy as np
+import pandas as pd
+
+
+PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+
+
+def resample_returns(returns: np.ndarray, n_runs: int,
+                     method: Literal['shuffle', 'bootstrap'] = 'shuffle',
+                     rng: np.random.Generator = None) -> np.ndarray:
+    """
+    Return matrix (n_runs, n_trades) of resampled trade sequences
+    :param method: 'shuffle' - permutation of the trades, 'bootstrap' - sampling with replacement
+    """
+    rng = rng or np.random.default_rng()
+    returns = np.asarray(returns, dtype=np.float64)
+    sequences = np.empty((n_runs, returns.shape[0]))
+    if method == 'shuffle':
+        sequences[:] = returns
+        return rng.permuted(sequences, axis=1, out=sequences)
+    elif method == 'bootstrap':
+        return np.take(returns, rng.integers(0, returns.shape[0], size=sequences.shape), out=sequences)
+    raise ValueError("Choose either 'shuffle' or 'bootstrap'")
+
+
+def sequence_statistic(sequences: np.ndarray) -> dict:
+    """
+    Calculate statistic for each trade sequence (row) at once.
+    Drawdown is the same as indicators.drawdown: account starts from 100, drawdown in percents
+    :param sequences: matrix (n_runs, n_trades)
+    :return: dict of arrays with n_runs values
+    """
+    # at most 3 matrices are alive at once: sequences, equity and its rolling max (drawdown is divided in place),
+    # std is calculated before them, its temporary matrix is freed
+    sharp_ratio = sequences.mean(axis=1) / sequences.std(axis=1, ddof=1)
+    equity = np.cumsum(sequences, axis=1)
+    equity += 100
+    total = equity[:, -1] - 100
+    rolling_max = np.maximum.accumulate(equity, axis=1)
+    drawdown = np.divide(equity, rolling_max, out=rolling_max)
+    max_drawdown = (drawdown.min(axis=1) - 1.0) * 100
+    return {
+        'Total': total,
+        'Drawdown %': max_drawdown,
+        'Sharp Ratio': sharp_ratio,
+    }
+
+
+def monte_carlo(returns: pd.Series | np.ndarray,
+                n_runs: int = 10000,
+                method: Literal['shuffle', 'bootstrap'] = 'shuffle',
+                points: float = None,
+                percentiles: tuple = PERCENTILES,
+                memory_limit: int = 256 * 2 ** 20,
+                seed: int = None) -> pd.DataFrame:
+    """
+    Monte Carlo simulation of trade sequences. The runs are processed in chunks,
+    so the resampled matrix and its equity never take more than memory_limit bytes
+    :param returns: profit of each trade (TradeTester.returns)
+    :param n_runs: number of simulated sequences
+    :param method: 'shuffle' or 'bootstrap' (see resample_returns)
+    :param points: if set, Total is shown in pips
+    :param percentiles: percentiles to show
+    :param memory_limit: memory budget in bytes
+    :param seed: random seed
+    :return: pd.DataFrame with percentiles of Total, Drawdown % and Sharp Ratio
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    if returns.shape[0] == 0:
+        raise ValueError('There are no returns to simulate')
+    rng = np.random.default_rng(seed)
+    # sequences, equity and rolling max are float64 matrices of the chunk size (see sequence_statistic),
+    # bootstrap indices (int64) and sequences take 2 matrices
+    chunk_runs = max(1, memory_limit // (3 * 8 * returns.shape[0]))
+
+    stats = {}
+    for start in range(0, n_runs, chunk_runs):
+        sequences = resample_returns(returns, min(chunk_runs, n_runs - start), method, rng)
+        for name, values in sequence_statistic(sequences).items():
+            stats.setdefault(name, []).append(values)
+    stats = {name: np.concatenate(values) for name, values in stats.items()}
+
+    if points:
+        stats['Total (pips)'] = stats.pop('Total') / points
+    return pd.DataFrame({name: np.percentile(values, percentiles) for name, values in stats.items()},
+                        index=[f'{p}%' for p in percentiles])
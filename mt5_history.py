@@ -0,0 +1,166 @@
+import os
+import json
+import importlib
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import pandas as pd
+
+
+STORE_DIR = 'mt5_history'
+CHUNK = timedelta(days=180)
+
+
+class HistoryStore:
+    """
+    Local append-only columnar store of one symbol/timeframe: one raw binary file per column and meta.json.
+    Rows are committed by meta.json, which is replaced atomically after the columns are appended,
+    so a broken update never leaves half written rows visible
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.meta = self.__read_meta()
+
+    def __read_meta(self) -> dict:
+        try:
+            with open(os.path.join(self.path, 'meta.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'rows': 0, 'columns': {}}
+
+    def __write_meta(self):
+        tmp_path = os.path.join(self.path, f'meta.json.tmp{os.getpid()}')
+        with open(tmp_path, 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_path, os.path.join(self.path, 'meta.json'))
+
+    def __column_path(self, name: str) -> str:
+        return os.path.join(self.path, f'{name}.bin')
+
+    def __len__(self):
+        return self.meta['rows']
+
+    def column(self, name: str, mmap: bool = True) -> np.ndarray:
+        dtype = np.dtype(self.meta['columns'][name])
+        if self.meta['rows'] == 0:
+            return np.empty(0, dtype=dtype)
+        if mmap:
+            return np.memmap(self.__column_path(name), dtype=dtype, mode='r', shape=(self.meta['rows'],))
+        return np.fromfile(self.__column_path(name), dtype=dtype, count=self.meta['rows'])
+
+    def last_time(self):
+        """Time of the last stored bar (epoch seconds) or None if the store is empty"""
+        if self.meta['rows'] == 0:
+            return None
+        return int(self.column('time')[-1])
+
+    def truncate(self, rows: int):
+        """Keep only the first rows"""
+        self.meta['rows'] = min(rows, self.meta['rows'])
+        self.__write_meta()
+        for name, dtype in self.meta['columns'].items():
+            os.truncate(self.__column_path(name), self.meta['rows'] * np.dtype(dtype).itemsize)
+
+    def append(self, rates: np.ndarray):
+        """Append structured array of bars (as returned by MetaTrader5.copy_rates_*)"""
+        if rates.shape[0] == 0:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        if not self.meta['columns']:
+            self.meta['columns'] = {name: rates.dtype[name].str for name in rates.dtype.names}
+        for name, dtype in self.meta['columns'].items():
+            path = self.__column_path(name)
+            with open(path, 'ab') as f:
+                # drop rows of a broken update, which were written but not committed
+                f.truncate(self.meta['rows'] * np.dtype(dtype).itemsize)
+                f.write(np.ascontiguousarray(rates[name], dtype=dtype).tobytes())
+        self.meta['rows'] += rates.shape[0]
+        self.__write_meta()
+
+    def to_frame(self, date_as_index: bool = True) -> pd.DataFrame:
+        """Return stored bars in the same format as utils_metatrader.get_data"""
+        data = pd.DataFrame({name: self.column(name, mmap=False) for name in self.meta['columns']})
+        data['time'] = pd.to_datetime(data['time'], unit='s')
+        data.drop('real_volume', axis=1, inplace=True, errors='ignore')
+        data.rename(columns={'tick_volume': 'volume'}, inplace=True)
+        if date_as_index:
+            data.set_index(data['time'], inplace=True)
+        return data
+
+
+def _backend(backend=None):
+    """Module with MetaTrader5 API (initialize, shutdown, copy_rates_range, TIMEFRAME_*), default is MetaTrader5"""
+    if backend is None or isinstance(backend, str):
+        return importlib.import_module(backend or 'MetaTrader5')
+    return backend
+
+
+def _timeframe(mt5, timeframe):
+    """Timeframe constant and its name for the store: 'H1' or mt5.TIMEFRAME_H1"""
+    if isinstance(timeframe, str):
+        return getattr(mt5, f'TIMEFRAME_{timeframe}'), timeframe
+    return timeframe, str(timeframe)
+
+
+def store_path(symbol: str, timeframe, store_dir: str = STORE_DIR) -> str:
+    return os.path.join(store_dir, f'{symbol}_{timeframe}')
+
+
+def update_history(mt5, symbol: str, timeframe, store_dir: str = STORE_DIR,
+                   from_date: str = '2015-01-01', to_date: datetime = None, chunk: timedelta = CHUNK) -> HistoryStore:
+    """
+    Download only bars, that are newer than the last stored one, in chunks of CHUNK length.
+    The last stored bar is downloaded again, as it could be unfinished.
+    mt5 must be initialized (see fetch_history)
+    """
+    timeframe, name = _timeframe(mt5, timeframe)
+    store = HistoryStore(store_path(symbol, name, store_dir))
+    last_time = store.last_time()
+    if last_time is None:
+        start = datetime.fromisoformat(from_date).replace(tzinfo=timezone.utc)
+    else:
+        start = datetime.fromtimestamp(last_time, tz=timezone.utc)
+        store.truncate(len(store) - 1)
+    end = to_date or datetime.now(tz=timezone.utc)
+    if end.tzinfo is None:
+        # naive dates are UTC, as in utils_metatrader.get_data
+        end = end.replace(tzinfo=timezone.utc)
+
+    while start <= end:
+        chunk_end = min(start + chunk, end)
+        rates = mt5.copy_rates_range(symbol, timeframe, start, chunk_end)
+        if rates is None:
+            error = mt5.last_error() if hasattr(mt5, 'last_error') else None
+            raise ValueError(f"MT5 didn't return {symbol} data from {start} to {chunk_end}: {error}")
+        # chunk ends are inclusive, so the bar on the border can come twice
+        last_time = store.last_time()
+        if last_time is not None:
+            rates = rates[rates['time'] > last_time]
+        store.append(rates)
+        start = chunk_end + timedelta(seconds=1)
+    return store
+
+
+def fetch_history(symbols: list, timeframe='H1', store_dir: str = STORE_DIR,
+                  from_date: str = '2015-01-01', to_date: datetime = None,
+                  chunk: timedelta = CHUNK, backend=None) -> dict:
+    """
+    Update local history of the symbols with one MT5 connection
+    :param symbols: symbol names (EURUSD)
+    :param timeframe: 'H1' or mt5.TIMEFRAME_H1
+    :param store_dir: directory of the local store
+    :param from_date: start date (ISO FORMAT), used only for symbols, that aren't stored yet
+    :param to_date: last date, default is now, naive datetime is treated as UTC
+    :param chunk: length of one request
+    :param backend: MetaTrader5 module or its name, e.g. a fake module for tests
+    :return: {symbol: HistoryStore}
+    """
+    mt5 = _backend(backend)
+    if not mt5.initialize():
+        mt5.shutdown()
+        raise ConnectionError('MetaTrader5 initialize() failed')
+    try:
+        return {symbol: update_history(mt5, symbol, timeframe, store_dir, from_date, to_date, chunk)
+                for symbol in symbols}
+    finally:
+        mt5.shutdown()
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+
+OHLCV_AGG = {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'}
+
+
+def resample_ohlc(df: pd.DataFrame, rule: str, dt_column: str = 'dt', offset: str = None) -> pd.DataFrame:
+    """
+    Resample OHLC(V) data to a higher timeframe. Bars are labeled by their open time,
+    empty bins (weekends, holidays) are dropped
+    :param df: base timeframe data with dt, open, high, low, close (and volume) columns
+    :param rule: pandas frequency of the higher timeframe: '4h', '1D', ...
+    :param offset: shift of the bins, e.g. '9h' for days starting at 9:00
+    :return: pd.DataFrame with the same columns and 'last_bar' - index of the last base bar in each higher bar
+    """
+    dt = pd.DatetimeIndex(df[dt_column])
+    agg = {column: how for column, how in OHLCV_AGG.items() if column in df.columns}
+    frame = pd.DataFrame({column: np.asarray(df[column]) for column in agg}, index=dt)
+    frame['last_bar'] = np.arange(df.shape[0])
+    resampled = frame.resample(rule, offset=offset, label='left', closed='left').agg({**agg, 'last_bar': 'max'})
+    resampled = resampled.dropna(subset=['open'])
+    resampled['last_bar'] = resampled['last_bar'].astype(np.int64)
+    return resampled.rename_axis(dt_column).reset_index()
+
+
+def align_to_base(values: np.ndarray, available_dt: np.ndarray, base_dt: np.ndarray, fill=0) -> np.ndarray:
+    """
+    Broadcast higher timeframe values onto base bars using only completed higher bars:
+    each base bar gets the value of the last higher bar, that is available at its time.
+    :param values: value of each higher timeframe bar
+    :param available_dt: sorted times, when each value becomes known (e.g. base bar, at which close the higher bar is complete)
+    :param base_dt: times of base bars
+    :param fill: value for base bars before the first completed higher bar
+    """
+    values = np.asarray(values)
+    idx = np.searchsorted(np.asarray(available_dt), np.asarray(base_dt), side='right') - 1
+    return np.where(idx >= 0, values[np.maximum(idx, 0)], fill)
+
+
+def higher_timeframe_trend(df: pd.DataFrame, rule: str, trend_func, dt_column: str = 'dt',
+                           offset: str = None, fill: int = 0) -> np.ndarray:
+    """
+    Calculate trend on a higher timeframe and align it to the base bars without lookahead:
+    the higher bar is used from its last base bar, when all its data is known.
+    trend = higher_timeframe_trend(df, '4h', lambda h4: channel_trend(h4['high'], h4['low'], 24))
+    tester.add_trend(trend)
+    :param df: base timeframe data
+    :param rule: higher timeframe ('4h', '1D', ...)
+    :param trend_func: function, that takes resampled pd.DataFrame and returns trend (1, -1, 0) of each higher bar
+    :param offset: shift of the higher timeframe bins (see resample_ohlc)
+    :param fill: trend before the first completed higher bar
+    :return: np.array of the trend for every base bar
+    """
+    higher = resample_ohlc(df, rule, dt_column, offset)
+    trend = np.asarray(trend_func(higher))
+    base_dt = np.asarray(pd.DatetimeIndex(df[dt_column]).asi8)
+    return align_to_base(trend, base_dt[higher['last_bar'].values], base_dt, fill)
@@ -0,0 +1,109 @@
+import heapq
+from fill_engine import first_touch
+from order_book import BUY, SELL, STOP, IN_MARKET
+
+
+class LevelHeap:
+    """
+    Price levels of orders, that are triggered when the price crosses them in one direction.
+    The nearest level is on the top, so a bar pops only the levels it has crossed.
+    Orders, that left EXPECTED status (e.g. closed by another level), are removed lazily
+    """
+
+    def __init__(self, direction: int, inclusive: bool, expected: int):
+        """
+        :param direction: 1 - triggered when high goes above the level, -1 - when low goes below the level
+        :param inclusive: if True, touching the level is enough
+        :param expected: status code (see order_book) of the orders in the heap
+        """
+        self.direction = direction
+        self.inclusive = inclusive
+        self.expected = expected
+        self.heap = []
+        # (top entry, bar where it is crossed), the top's level doesn't change, so the search is done once
+        self.next_bar = None
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, level: float, row: int):
+        # NaN level (not enough bars to calculate it) is never crossed
+        if level == level:
+            heapq.heappush(self.heap, (level * self.direction, row))
+
+    def __clean(self, status):
+        heap = self.heap
+        while heap and status[heap[0][1]] != self.expected:
+            heapq.heappop(heap)
+
+    def __crossed(self, key: float, hi: float, lo: float) -> bool:
+        level = key * self.direction
+        if self.direction == 1:
+            return hi >= level if self.inclusive else hi > level
+        return lo <= level if self.inclusive else lo < level
+
+    def pop_crossed(self, hi: float, lo: float, status) -> list:
+        """Pop and return rows of orders, which levels are crossed by the bar"""
+        rows = []
+        self.__clean(status)
+        while self.heap and self.__crossed(self.heap[0][0], hi, lo):
+            rows.append(heapq.heappop(self.heap)[1])
+            self.__clean(status)
+        return rows
+
+    def next_touch(self, hi, lo, start: int, status) -> int:
+        """Return the first bar from start, where the nearest level is crossed, -1 if it's never crossed"""
+        self.__clean(status)
+        if not self.heap:
+            return -1
+        top = self.heap[0]
+        if self.next_bar is None or self.next_bar[0] != top:
+            series = hi if self.direction == 1 else lo
+            self.next_bar = (top, first_touch(series, start, top[0] * self.direction, self.direction, self.inclusive))
+        return self.next_bar[1]
+
+
+class OpenOrders:
+    """
+    Open orders of the OrderBook indexed by price levels: pended orders by entry level,
+    orders in market by SL and by TP, separately for each direction.
+    A bar checks only the orders, which levels it has crossed, so its cost depends on the number of fills,
+    not on the number of open orders
+    """
+
+    def __init__(self):
+        self.entries = {BUY: LevelHeap(1, False, STOP), SELL: LevelHeap(-1, False, STOP)}
+        self.stops = {BUY: LevelHeap(-1, True, IN_MARKET), SELL: LevelHeap(1, True, IN_MARKET)}
+        self.takes = {BUY: LevelHeap(1, True, IN_MARKET), SELL: LevelHeap(-1, True, IN_MARKET)}
+        self.rows = set()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __heaps(self):
+        return (*self.entries.values(), *self.stops.values(), *self.takes.values())
+
+    def pend(self, row: int, direction: int, open_price: float):
+        self.rows.add(row)
+        self.entries[direction].push(open_price, row)
+
+    def fill(self, row: int, direction: int, sl: float, tp: float):
+        self.stops[direction].push(sl, row)
+        self.takes[direction].push(tp, row)
+
+    def close(self, row: int):
+        self.rows.discard(row)
+
+    def crossed_entries(self, hi: float, lo: float, status) -> list:
+        return self.entries[BUY].pop_crossed(hi, lo, status) + self.entries[SELL].pop_crossed(hi, lo, status)
+
+    def crossed_stops(self, hi: float, lo: float, status) -> list:
+        return self.stops[BUY].pop_crossed(hi, lo, status) + self.stops[SELL].pop_crossed(hi, lo, status)
+
+    def crossed_takes(self, hi: float, lo: float, status) -> list:
+        return self.takes[BUY].pop_crossed(hi, lo, status) + self.takes[SELL].pop_crossed(hi, lo, status)
+
+    def next_event(self, hi, lo, start: int, status) -> int:
+        """Return the first bar from start, where any level is crossed, -1 if there is no such bar"""
+        bars = [bar for bar in (heap.next_touch(hi, lo, start, status) for heap in self.__heaps()) if bar != -1]
+        return min(bars, default=-1)
@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+
+
+# Order status codes
+STOP = 0
+IN_MARKET = 1
+TP = 2
+SL = 3
+CANCELED = 4
+CLOSED = 5
+STATUSES = ('stop', 'in market', 'tp', 'sl', 'canceled', 'closed')
+
+# Order direction codes
+BUY = 1
+SELL = -1
+DIRECTIONS = ('buy', 'sell')
+
+WIN_LOSE = ('win', 'lose', 'canceled')
+
+
+class OrderBook:
+    """
+    Columnar order book. Each column is a typed numpy array, that grows twice when it's full.
+    Datetimes are not stored, they are taken from the data by bar indices when the book is formed
+    """
+    COLUMNS = {
+        'bar_id': np.int64,
+        'order_dir': np.int8,
+        'open_price': np.float64,
+        'sl': np.float64,
+        'tp': np.float64,
+        'close_bar_id': np.int64,
+        'close_price': np.float64,
+        'status': np.int8,
+    }
+
+    def __init__(self, capacity: int = 1024):
+        self.size = 0
+        self.capacity = capacity
+        for name, dtype in self.COLUMNS.items():
+            setattr(self, name, np.empty(capacity, dtype=dtype))
+
+    def __len__(self):
+        return self.size
+
+    def __grow(self):
+        self.capacity *= 2
+        for name, dtype in self.COLUMNS.items():
+            column = np.empty(self.capacity, dtype=dtype)
+            column[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, column)
+
+    def open_order(self, bar_id: int, order_dir: int, open_price: float, sl: float, tp: float) -> int:
+        """
+        Add pended order into the book
+        :return: row of the order
+        """
+        if self.size == self.capacity:
+            self.__grow()
+        row = self.size
+        self.bar_id[row] = bar_id
+        self.order_dir[row] = order_dir
+        self.open_price[row] = open_price
+        self.sl[row] = sl
+        self.tp[row] = tp
+        self.close_bar_id[row] = -1
+        self.close_price[row] = np.nan
+        self.status[row] = STOP
+        self.size += 1
+        return row
+
+    def close_order(self, row: int, close_bar_id: int, close_price: float, status: int):
+        self.close_bar_id[row] = close_bar_id
+        self.close_price[row] = close_price
+        self.status[row] = status
+
+    def column(self, name: str) -> np.ndarray:
+        """Return filled part of the column (view)"""
+        return getattr(self, name)[:self.size]
+
+    def to_frame(self, dt: np.ndarray) -> pd.DataFrame:
+        """
+        Return closed orders as pd.DataFrame.
+        Numeric columns are views of the book, if there are no orders in work
+        :param dt: datetime data, used to get open_dt and close_dt by bar indices
+        """
+        status = self.column('status')
+        closed = status >= TP
+        rows = slice(None) if closed.all() else closed
+
+        bar_id = self.column('bar_id')[rows]
+        order_dir = self.column('order_dir')[rows]
+        open_price = self.column('open_price')[rows]
+        close_bar_id = self.column('close_bar_id')[rows]
+        close_price = self.column('close_price')[rows]
+        status = status[rows]
+
+        profit = (close_price - open_price) * order_dir
+        win_lose = np.where(profit > 0, 0,
+                   np.where(profit < 0, 1,
+                                        2)).astype(np.int8)
+
+        return pd.DataFrame({
+            'bar_id': bar_id,
+            'order_dir': pd.Categorical.from_codes((order_dir == SELL).astype(np.int8), DIRECTIONS),
+            'open_dt': dt[bar_id],
+            'open_price': open_price,
+            'close_dt': dt[close_bar_id],
+            'close_bar_id': close_bar_id,
+            'close_price': close_price,
+            'status': pd.Categorical.from_codes(status, STATUSES),
+            'profit': profit,
+            'bars_in_deal': close_bar_id - bar_id,
+            'win/lose': pd.Categorical.from_codes(win_lose, WIN_LOSE),
+        }, copy=False)
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+
+def pad_profits(profits: list) -> np.ndarray:
+    """Stack profit arrays of several runs into one matrix (n_runs, max_orders), padded with NaN"""
+    batch = np.full((len(profits), max((len(p) for p in profits), default=0)), np.nan)
+    for i, profit in enumerate(profits):
+        batch[i, :len(profit)] = profit
+    return batch
+
+
+def _max_streak(hit: np.ndarray, breaks: np.ndarray) -> np.ndarray:
+    """Return max number of HIT values in a row for each run. Only BREAKS reset the streak"""
+    count = np.cumsum(hit, axis=1)
+    count_at_break = np.maximum.accumulate(np.where(breaks, count, 0), axis=1)
+    return (count - count_at_break).max(axis=1, initial=0)
+
+
+def order_statistic(profit: np.ndarray, points: float = 0.00001) -> dict:
+    """
+    Calculate strategy statistic from order profits. All metrics are calculated
+    from the same win/lose masks and one equity curve, without filtering copies.
+    Orders with zero profit are canceled (as in TradeTester), NaN values are ignored (padding).
+    :param profit: 1-D array with profit of each order, or 2-D array (n_runs, n_orders) for a batch of runs
+    :param points: 1 pip for the instrument
+    :return: dict {metric: np.array with one value per run}
+    """
+    profit = np.asarray(profit, dtype=np.float64)
+    if profit.ndim == 1:
+        profit = profit[np.newaxis, :]
+
+    present = ~np.isnan(profit)
+    filled = np.where(present, profit, 0)
+    win = filled > 0
+    lose = filled < 0
+
+    n_orders = present.sum(axis=1)
+    n_win = win.sum(axis=1)
+    n_lose = lose.sum(axis=1)
+    order_count = n_win + n_lose
+    canceled = n_orders - order_count
+
+    gross_profit = np.where(win, filled, 0).sum(axis=1)
+    gross_loss = np.where(lose, filled, 0).sum(axis=1)
+    total = gross_profit + gross_loss
+
+    # the same as indicators.drawdown: account starts from 100
+    equity = np.cumsum(filled, axis=1) + 100
+    drawdown = equity / np.maximum.accumulate(equity, axis=1) - 1.0
+    max_drawdown = drawdown.min(axis=1, initial=0) * 100
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = total / n_orders
+        std = np.sqrt(((filled - mean[:, np.newaxis]) ** 2 * present).sum(axis=1) / (n_orders - 1))
+        avg_profit = gross_profit / n_win
+        avg_loss = gross_loss / n_lose
+
+        return {
+            'Orders count:': order_count,
+            'Canceled:': canceled,
+            'Canceled %:': canceled * 100 / order_count,
+            'Win %:': n_win * 100 / order_count,
+            'Lose %:': n_lose * 100 / order_count,
+            'Avg Profit (pips):': avg_profit / points,
+            'Avg Loss (pips):': avg_loss / points,
+            'PnL order ratio:': n_win / (n_win + n_lose),
+            'PnL profit ratio:': avg_profit / np.abs(avg_loss),
+            'Total (pips):': total / points,
+            'Drawdown %:': max_drawdown,
+            'Sharp Ratio:': mean / std,
+            'Profit factor:': gross_profit / np.abs(gross_loss),
+            'Expectancy (pips):': total / order_count / points,
+            'Max win streak:': _max_streak(win, lose),
+            'Max lose streak:': _max_streak(lose, win),
+        }
+
+
+def order_statistic_frame(profit: np.ndarray, points: float = 0.00001, index=None) -> pd.DataFrame:
+    """Return order_statistic as pd.DataFrame, one row per run"""
+    return pd.DataFrame(order_statistic(profit, points), index=index)
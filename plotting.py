@@ -0,0 +1,100 @@
+from io import BytesIO
+from typing import Literal
+from indicators import drawdown
+import numpy as np
+import pandas as pd
+from matplotlib.figure import Figure
+
+
+MAX_POINTS = 2000
+HIST_BINS = 30
+SCATTER_BINS = 100
+
+
+def minmax_indices(y: np.ndarray, max_points: int = MAX_POINTS) -> np.ndarray:
+    """
+    Min/max decimation: split the series into max_points / 2 buckets and keep the lowest and the highest
+    point of each bucket (and both ends), so peaks and drawdowns stay on the plot
+    :return: sorted indices of the points to draw
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = y.shape[0]
+    if n <= max_points:
+        return np.arange(n)
+
+    n_buckets = max(max_points // 2, 1)
+    size = -(-n // n_buckets)
+    # the last bucket is padded with the last value, padded indices are clipped to the last point
+    padded = np.concatenate([y, np.full(size * n_buckets - n, y[-1])]).reshape(n_buckets, size)
+    offsets = np.arange(n_buckets) * size
+    indices = np.concatenate([offsets + padded.argmin(axis=1), offsets + padded.argmax(axis=1), [0, n - 1]])
+    return np.unique(np.minimum(indices, n - 1))
+
+
+def plot_line(ax, x: np.ndarray, y: np.ndarray, max_points: int = MAX_POINTS, **kwargs):
+    idx = minmax_indices(y, max_points)
+    return ax.plot(np.asarray(x)[idx], np.asarray(y)[idx], **kwargs)
+
+
+def plot_hist(ax, values: np.ndarray, bins: int = HIST_BINS, **kwargs):
+    """Histogram is binned with numpy, matplotlib draws only the bins"""
+    counts, edges = np.histogram(np.asarray(values, dtype=np.float64), bins=bins)
+    return ax.hist(edges[:-1], bins=edges, weights=counts, **kwargs)
+
+
+def plot_scatter(ax, x: np.ndarray, y: np.ndarray, max_points: int = MAX_POINTS, bins: int = SCATTER_BINS):
+    """Scatter plot, large data is drawn as a 2-D histogram of point density"""
+    if len(x) <= max_points:
+        return ax.scatter(x, y)
+    counts, x_edges, y_edges = np.histogram2d(np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64),
+                                              bins=bins)
+    return ax.pcolormesh(x_edges, y_edges, np.ma.masked_equal(counts.T, 0), cmap='Blues')
+
+
+def draw_statistic(fig: Figure, order_book: pd.DataFrame, returns: pd.Series, max_points: int = MAX_POINTS):
+    """
+    Draw account gain, returns distribution, drawdown and order lifetime of TradeTester order book into the figure.
+    Each plot draws at most max_points points, so render time doesn't depend on the number of orders
+    """
+    profit = order_book['profit']
+    open_dt = order_book['open_dt'].values
+    trade_drawdown, max_drawdown = drawdown(profit)
+
+    ax = fig.subplots(2, 2)
+    ax[0, 0].set_title('Account gain')
+    plot_line(ax[0, 0], open_dt, profit.cumsum().values, max_points)
+    ax[0, 0].set_xlabel('Date')
+    ax[0, 0].set_ylabel('Account')
+    ax[0, 0].xaxis.set_tick_params(rotation=45)
+
+    ax[0, 1].set_title('Returns distribution')
+    plot_hist(ax[0, 1], returns)
+    ax[0, 1].vlines(0,
+                    ymin=0,
+                    ymax=ax[0, 1].get_ylim()[1],
+                    colors='k', linestyles='dashed')
+    ax[0, 1].set_xlabel('Returns')
+    ax[0, 1].set_ylabel('Count')
+
+    ax[1, 0].set_title('Drawdown')
+    plot_line(ax[1, 0], open_dt, trade_drawdown.values, max_points)
+    plot_line(ax[1, 0], open_dt, max_drawdown.values, max_points)
+    ax[1, 0].set_xlabel('Date')
+    ax[1, 0].set_ylabel('Drawdown')
+    ax[1, 0].xaxis.set_tick_params(rotation=45)
+
+    ax[1, 1].set_title('Order lifetime')
+    plot_scatter(ax[1, 1], order_book['bars_in_deal'].values, profit.values, max_points)
+    ax[1, 1].set_xlabel('Bars')
+    ax[1, 1].set_ylabel('Profit')
+
+    fig.suptitle("Overview", fontsize=16)
+    fig.tight_layout()
+    return fig
+
+
+def render_figure(fig: Figure, fmt: Literal['png', 'svg'] = 'png', dpi: int = 100) -> bytes:
+    """Render the figure into PNG or SVG bytes without any GUI backend"""
+    buffer = BytesIO()
+    fig.savefig(buffer, format=fmt, dpi=dpi)
+    return buffer.getvalue()
@@ -0,0 +1,33 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from time import perf_counter
+import pandas as pd
+
+
+class Profiler:
+    """Collects wall time of named phases and event counters"""
+
+    def __init__(self):
+        self.timings = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.counters = defaultdict(int)
+
+    @contextmanager
+    def phase(self, name: str):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] += perf_counter() - start
+            self.calls[name] += 1
+
+    def count(self, name: str, value: int = 1):
+        self.counters[name] += value
+
+    def to_dict(self) -> dict:
+        return {'timings': dict(self.timings), 'calls': dict(self.calls), 'counters': dict(self.counters)}
+
+    def to_frame(self) -> pd.DataFrame:
+        """Return phases with time (s) and number of calls"""
+        return pd.DataFrame({'time (s)': pd.Series(self.timings, dtype=float),
+                             'calls': pd.Series(self.calls, dtype=int)})
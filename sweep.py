@@ -0,0 +1,199 @@
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from itertools import product
+from trade_tester import TradeTester
+from indicators import level_crosses, ma_trend
+from indicator_cache import CachedTalib
+import numpy as np
+import pandas as pd
+
+
+# Config keys, that are passed into TradeTester. All other keys are passed into signal builder
+TESTER_KEYS = ('n', 'entry_method', 'entry_value', 'entry_mult', 'order_type',
+               'sl_method', 'sl_value', 'sl_mult', 'tp_method', 'tp_value', 'tp_mult')
+LEVEL_KEYS = ('sl_method', 'sl_value', 'sl_mult', 'tp_method', 'tp_value', 'tp_mult')
+OHLCV_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+WORKER_CACHE_SIZE = 32
+# Indicators are memoized per process, so configs with partly the same signal parameters share them
+ta = CachedTalib()
+
+# Worker state, filled once per process by _init_worker
+_shm = []
+_data = {}
+_signal_cache = {}
+_levels_cache = {}
+
+
+def param_grid(**params) -> list[dict]:
+    """
+    Return all combinations of parameters
+    param_grid(sl_method=['atr'], sl_value=[12, 24]) -> [{'sl_method': 'atr', 'sl_value': 12}, {...}]
+    """
+    keys = list(params.keys())
+    return [dict(zip(keys, values)) for values in product(*params.values())]
+
+
+def sma_mfi_signals(op: np.ndarray, hi: np.ndarray, lo: np.ndarray, cl: np.ndarray, vo: np.ndarray, params: dict):
+    """
+    Default signal builder: SMA(close) slope as a trend and MFI level crosses as entries without filters (the same as test_mfi.py)
+    params: trend_period, ind_period, ma_thresh (default 1), cross_level (default 50)
+    :return: (trend, entries)
+    """
+    ma = pd.Series(ta.SMA(cl, params['trend_period']))
+    trend = ma_trend(ma, params.get('ma_thresh', 1))
+    mfi = pd.Series(ta.MFI(hi, lo, cl, vo, params['ind_period']))
+    entries = level_crosses(mfi, params.get('cross_level', 50))
+    return trend, entries
+
+
+def _share_array(array: np.ndarray):
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    shared = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+    shared[:] = array
+    return shm
+
+
+def _init_worker(dt_name: str, ohlcv_name: str, n_bars: int, signal_builder, points: float):
+    dt_shm = shared_memory.SharedMemory(name=dt_name)
+    ohlcv_shm = shared_memory.SharedMemory(name=ohlcv_name)
+    _shm.extend([dt_shm, ohlcv_shm])   # keep references, so buffers are alive while the worker works
+
+    ohlcv = np.ndarray((len(OHLCV_COLUMNS), n_bars), dtype=np.float64, buffer=ohlcv_shm.buf)
+    _data['dt'] = np.ndarray((n_bars,), dtype=np.int64, buffer=dt_shm.buf).view('datetime64[ns]')
+    for i, column in enumerate(OHLCV_COLUMNS):
+        _data[column] = ohlcv[i]
+    _data['signal_builder'] = signal_builder
+    _data['points'] = points
+
+
+def _signal_key(config: dict):
+    return tuple(sorted((k, v) for k, v in config.items() if k not in TESTER_KEYS))
+
+
+def _levels_key(config: dict):
+    return tuple(config.get(k) for k in LEVEL_KEYS)
+
+
+def _cached(cache: dict, key, compute):
+    if key not in cache:
+        if len(cache) >= WORKER_CACHE_SIZE:
+            cache.pop(next(iter(cache)))
+        cache[key] = compute()
+    return cache[key]
+
+
+def _get_signals(config: dict):
+    """Return (trend, entries) for the whole series"""
+    key = _signal_key(config)
+    return _cached(_signal_cache, key,
+                   lambda: _data['signal_builder'](_data['open'], _data['high'], _data['low'],
+                                                   _data['close'], _data['volume'], dict(key)))
+
+
+def _create_tester(config: dict, start: int = 0, end: int = None) -> TradeTester:
+    tester = TradeTester(points=_data['points'], show_progress=False)
+    tester.add_data(
+        datetime_data=_data['dt'][start:end],
+        open_data=_data['open'][start:end],
+        high_data=_data['high'][start:end],
+        low_data=_data['low'][start:end],
+        close_data=_data['close'][start:end]
+    )
+    if 'entry_method' in config:
+        tester.set_entry_method(config['entry_method'], config.get('entry_value'),
+                                config.get('entry_mult'), config.get('order_type', 'stop'))
+    tester.set_stoploss_method(config['sl_method'], config['sl_value'], config.get('sl_mult', 2))
+    tester.set_takeprofit_method(config['tp_method'], config['tp_value'], config.get('tp_mult', 3))
+    return tester
+
+
+def _get_levels(config: dict):
+    """Return (sl_levels, tp_levels) for the whole series"""
+    def compute():
+        tester = _create_tester(config)
+        tester.prepare_levels()
+        return tester.sl_levels, tester.tp_levels
+    return _cached(_levels_cache, _levels_key(config), compute)
+
+
+def run_config(config: dict, start: int = 0, end: int = None) -> TradeTester:
+    """
+    Run TradeTester with config on the bars [start, end) of the shared data (in a worker process).
+    Signals and SL/TP levels are calculated for the whole series once and then sliced,
+    so windows don't lose history for indicators warm up
+    """
+    trend, entries = _get_signals(config)
+    sl_levels, tp_levels = _get_levels(config)
+
+    tester = _create_tester(config, start, end)
+    tester.add_trend(np.asarray(trend)[start:end])
+    tester.add_entries(np.asarray(entries)[start:end])
+    tester.set_levels(tuple(levels[start:end] for levels in sl_levels),
+                      tuple(levels[start:end] for levels in tp_levels))
+    tester.run_strategy(n=config.get('n', 0))
+    return tester
+
+
+def config_statistic(tester: TradeTester) -> dict:
+    """Return form_order_statistic as dict, empty dict if there are not enough orders"""
+    try:
+        return tester.form_order_statistic().iloc[0].to_dict()
+    except (KeyError, IndexError):
+        return {}
+
+
+def _run_config(task):
+    config_id, config = task
+    return config_id, config_statistic(run_config(config))
+
+
+@contextmanager
+def shared_pool(data: pd.DataFrame, signal_builder=sma_mfi_signals, points: float = 0.00001, n_workers: int = None):
+    """
+    Place OHLC data into shared memory and yield ProcessPoolExecutor, which workers are attached to it.
+    Shared memory is released on exit
+    """
+    n_bars = data.shape[0]
+    dt = np.asarray(data['dt'].values, dtype='datetime64[ns]').view(np.int64)
+    ohlcv = np.vstack([data[column].values.astype(np.float64) for column in OHLCV_COLUMNS])
+
+    dt_shm = _share_array(dt)
+    ohlcv_shm = _share_array(ohlcv)
+    try:
+        with ProcessPoolExecutor(max_workers=n_workers,
+                                 initializer=_init_worker,
+                                 initargs=(dt_shm.name, ohlcv_shm.name, n_bars, signal_builder, points)) as executor:
+            yield executor
+    finally:
+        dt_shm.close()
+        dt_shm.unlink()
+        ohlcv_shm.close()
+        ohlcv_shm.unlink()
+
+
+def run_sweep(data: pd.DataFrame,
+              configs: list[dict],
+              signal_builder=sma_mfi_signals,
+              points: float = 0.00001,
+              n_workers: int = None,
+              chunksize: int = 4) -> pd.DataFrame:
+    """
+    Run TradeTester for each config in a process pool.
+    OHLC data is placed in shared memory once, workers only receive configs.
+    :param data: OHLC data with columns 'dt', 'open', 'high', 'low', 'close', 'volume'
+    :param configs: list of dicts (see param_grid). Keys from TESTER_KEYS set TradeTester methods,
+        other keys (trend_period, ind_period, ...) are passed into signal_builder
+    :param signal_builder: top-level function (op, hi, lo, cl, vo, params) -> (trend, entries)
+    :param points: 1 pip for the instrument
+    :param n_workers: number of processes, default is the number of CPUs
+    :param chunksize: number of configs sent to a worker at once
+    :return: pd.DataFrame with config columns and form_order_statistic columns, one row per config
+    """
+    # configs with the same signal params go one after another, so worker's signal cache is reused
+    tasks = sorted(enumerate(configs), key=lambda task: repr(_signal_key(task[1])))
+    with shared_pool(data, signal_builder, points, n_workers) as executor:
+        results = dict(executor.map(_run_config, tasks, chunksize=chunksize))
+
+    stats = pd.DataFrame([results[i] for i in range(len(configs))])
+    return pd.concat([pd.DataFrame(configs), stats], axis=1)
@@ -1,12 +1,12 @@
 from trade_tester import TradeTester
+from data_loader import load_ohlc
 from indicators import level_crosses
 import pandas as pd
 import numpy as np
 import talib as ta
 
 
-df = pd.read_csv('eurusd_h1.csv', parse_dates=['dt'])
-df.drop('pair', axis=1, inplace=True)
+df = load_ohlc('eurusd_h1.csv')
 
 PERIOD = 42
 df['ma'] = ta.SMA(df['close'], PERIOD)
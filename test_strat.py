@@ -1,15 +1,17 @@
 from trade_tester import TradeTester
+from data_loader import load_ohlc
 from indicators import level_crosses
 import pandas as pd
 import numpy as np
-import talib as ta
+from indicator_cache import CachedTalib, IndicatorCache, CACHE_DIR
 from indicators import donchian_channel, channel_trend, trend_based_on_impulse_candles
 from candlestick_patterns import impulse_candles
 from utils import create_filter
 
 
-df = pd.read_csv('eurusd_h1.csv', parse_dates=['dt'])
-df.drop('pair', axis=1, inplace=True)
+# indicators are stored on disk, so the next run of the script doesn't recompute them
+ta = CachedTalib(IndicatorCache(cache_dir=CACHE_DIR))
+df = load_ohlc('eurusd_h1.csv')
 
 PERIOD = 42
 df['ma'] = ta.SMA(ta.TYPPRICE(df['high'], df['low'], df['close']), PERIOD)
@@ -1,34 +1,30 @@
-from dataclasses import dataclass
 from typing import Literal
+from contextlib import nullcontext
 from tqdm import tqdm
-from indicators import lowest_value, highest_value
-from indicators import drawdown, sharp_ratio
+from fill_engine import first_touch, first_exit
+from levels import stoploss_levels, takeprofit_levels
+from order_book import OrderBook, BUY, IN_MARKET, TP, SL, CANCELED, CLOSED
+from open_orders import OpenOrders
+from profiler import Profiler
+from order_statistic import order_statistic_frame
+from intrabar import IntrabarData
+from plotting import MAX_POINTS, draw_statistic, render_figure
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
-import talib as ta
+from matplotlib.figure import Figure
 plt.style.use('seaborn-v0_8-whitegrid')
 
 
-@dataclass
-class Order:
-    bar_id: int
-    order_status: str
-    order_dir: str
-    open_dt: str
-    close_dt: str
-    close_bar_id: int
-    open_price: float
-    close_price: float
-    tp: float
-    sl: float
-
-
 class TradeTester:
     def __init__(
             self,
             points: float = 0.00001,
-            show_log: bool = False):
+            show_log: bool = False,
+            show_progress: bool = True,
+            profile: bool = False,
+            multi_position: bool = False,
+            max_positions: int = None):
         
         # Data
         self.dt = None
@@ -40,6 +36,8 @@ class TradeTester:
         self.trend = None
         self.entries = None
         self.filters = None
+        self.signals = None
+        self.intrabar = None
         self.result = None
 
         # Stop Loss and Take Profit Parameters
@@ -49,6 +47,9 @@ class TradeTester:
         self.tp_value = None
         self.sl_mult = 2
         self.tp_mult = 5
+        self.sl_levels = None
+        self.tp_levels = None
+        self.levels_params = None
 
         # Entry parameters
         self.entry_method = None
@@ -59,21 +60,18 @@ class TradeTester:
         self.indent = 5 * points
         self.points = points
         self.show_log = show_log
+        self.show_progress = show_progress
+        # Profiler of the last run, None if profiling is disabled
+        self.profile = profile
+        self.profiler = None
 
         # Order Parameters
+        # multi_position: several orders can be open at once, max_positions limits them (None - no limit)
+        self.multi_position = multi_position
+        self.max_positions = max_positions
         self.in_market = False
         self.order = None
-        self.orderBook = {
-            'bar_id': [],
-            'order_dir': [],
-            'open_dt': [],
-            'open_price': [],
-            'close_dt': [],
-            'close_bar_id': [],
-            'close_price': [],
-            'status': [],
-            'profit': []
-        }
+        self.orderBook = OrderBook()
         self.orderBookDf = None
         self.returns = None
 
@@ -102,6 +100,8 @@ class TradeTester:
             self.lo = low_data.values
             self.cl = close_data.values
             self.vo = volume_data.values if volume_data else None
+        self.sl_levels = None
+        self.tp_levels = None
     
     def add_trend(self, trend):
         if isinstance(trend, np.ndarray):
@@ -123,6 +123,21 @@ class TradeTester:
         else:
             self.filters = filters.values
 
+    def add_intrabar_data(self, intrabar: IntrabarData):
+        """
+        Add lower timeframe data (see intrabar.IntrabarData) to resolve ambiguous bars:
+        bars, where both SL and TP are touched, and bars, where the order could be opened and closed.
+        Without it SL has priority and the order can't be closed on the bar, where it's opened
+        """
+        self.intrabar = intrabar
+
+    def __bar_bounds(self, idx: int):
+        """Return start and end time of the bar in ns. The bar ends, when the next one starts"""
+        start = np.datetime64(self.dt[idx], 'ns').astype(np.int64)
+        if idx + 1 < self.dt.shape[0]:
+            return start, np.datetime64(self.dt[idx + 1], 'ns').astype(np.int64)
+        return start, np.iinfo(np.int64).max
+
     def set_entry_method(self, 
                          kind: Literal['close', 'channel', 'atr', 'bar_extremum'], 
                          value: int | float,
@@ -146,6 +161,41 @@ class TradeTester:
         if kind == 'atr':
             self.tp_mult = mult
 
+    def __levels_params(self):
+        return (self.sl_method, self.sl_value, self.sl_mult,
+                self.tp_method, self.tp_value, self.tp_mult, self.points)
+
+    def prepare_levels(self):
+        """
+        Calculate stop loss and take profit levels for every bar and both directions.
+        Levels are calculated once per SL/TP parameters, so repeated runs reuse them
+        """
+        levels_params = self.__levels_params()
+        if self.sl_levels is not None and self.levels_params == levels_params:
+            return
+
+        if self.profiler is not None:
+            self.profiler.count('level arrays computed', 2)
+            self.profiler.count('ATR computations', (self.sl_method == 'atr') + (self.tp_method == 'atr'))
+            self.profiler.count('channel computations', (self.sl_method == 'channel') + (self.tp_method == 'channel'))
+        self.sl_levels = stoploss_levels(self.hi, self.lo, self.cl,
+                                         self.sl_method, self.sl_value, self.sl_mult,
+                                         self.points, self.indent)
+        self.tp_levels = takeprofit_levels(self.hi, self.lo, self.cl,
+                                           self.tp_method, self.tp_value, self.tp_mult,
+                                           self.points, self.sl_levels)
+        self.levels_params = levels_params
+
+    def set_levels(self, sl_levels: tuple, tp_levels: tuple):
+        """
+        Set precalculated stop loss and take profit levels (see levels.py) for current SL/TP methods,
+        so run_strategy doesn't calculate them again
+        sl_levels, tp_levels: (buy_levels, sell_levels)
+        """
+        self.sl_levels = sl_levels
+        self.tp_levels = tp_levels
+        self.levels_params = self.__levels_params()
+
     def __get_sl(self, idx: int, trade_dir: int):
         """
         Return the price level, where stop loss will be set
@@ -154,41 +204,9 @@ class TradeTester:
             1: Buy
             -1: Sell
         """
-        if self.sl_method == 'fixed':
-            if trade_dir == 1:
-                return self.cl[idx] - self.sl_value * self.points
-            else:
-                return self.cl[idx] + self.sl_value * self.points
-            
-        elif self.sl_method == 'percent':
-            if trade_dir == 1:
-                return self.lo[idx] - (self.cl[idx] * self.sl_value / 100)
-            else:
-                return self.hi[idx] + (self.cl[idx] * self.sl_value / 100)
-        
-        elif self.sl_method == 'bar_extremum':
-            if trade_dir == 1:
-                return self.lo[idx] - self.indent
-            else:
-                return self.hi[idx] + self.indent
-            
-        elif self.sl_method == 'atr':
-            period = self.sl_value + 1
-            atr = ta.ATR(self.hi[idx-period:idx],
-                        self.lo[idx-period:idx],
-                        self.cl[idx-period:idx],
-                        self.sl_value)[-1]
-            if trade_dir == 1:
-                return self.lo[idx] - atr * self.sl_mult
-            else:
-                return self.hi[idx] + atr * self.sl_mult
-        
-        elif self.sl_method == 'channel':
-            if trade_dir == 1:
-                return lowest_value(self.lo[:idx], self.sl_value)
-            else:
-                return highest_value(self.hi[:idx], self.sl_value)
+        return self.sl_levels[0][idx] if trade_dir == 1 else self.sl_levels[1][idx]
 
+    @staticmethod
     def __unite_vectors(*vectors):
         if len(vectors) == 0:
             raise ValueError("At least one value must be provided")
@@ -201,6 +219,20 @@ class TradeTester:
             result = np.where(result == vec, result, 0)
 
         return result
+
+    def prepare_signals(self):
+        """
+        Fuse trend, entries and filters into one signal vector:
+        1 - buy signal, -1 - sell signal, 0 - nothing
+        """
+        # the bar loop read the vectors by bar index, so vectors longer than the data are used from the start
+        n_bars = len(self.cl)
+        united = self.__unite_vectors(*(v[:n_bars] for v in (self.trend, self.entries) if v is not None))
+        allowed = self.filters[:n_bars] == 1
+        self.signals = np.where((united == 1) & allowed,  1,
+                       np.where((united == -1) & allowed, -1,
+                                                           0)).astype(np.int8)
+        return self.signals
     
     def __get_tp(self, idx: int, trade_dir: int):
         """
@@ -210,253 +242,317 @@ class TradeTester:
             1: Buy
             -1: Sell
         """
-        if self.tp_method == 'fixed':
-            if trade_dir == 1:
-                return self.hi[idx] + self.tp_value * self.points
-            else:
-                return self.lo[idx] - self.tp_value * self.points
-        
-        elif self.tp_method == 'atr':
-            period = self.tp_value + 1
-            atr = ta.ATR(self.hi[idx-period:idx],
-                        self.lo[idx-period:idx],
-                        self.cl[idx-period:idx],
-                        self.tp_value)[-1]
-            if trade_dir == 1:
-                return self.hi[idx] + atr * self.tp_mult
-            else:
-                return self.lo[idx] - atr * self.tp_mult
-        
-        elif self.tp_method == 'channel':
-            if trade_dir == 1:
-                return highest_value(self.hi[:idx], self.tp_value)
-            else:
-                return lowest_value(self.lo[:idx], self.tp_value)
-        
-        elif self.tp_method == 'SL ratio':
-            sl = self.__get_sl(idx, trade_dir)
-            sl_distance = abs(self.lo[idx] - sl)
-            return self.lo[idx] - sl_distance * self.tp_value
+        return self.tp_levels[0][idx] if trade_dir == 1 else self.tp_levels[1][idx]
         
     def __calculate_profit(self, entry, close, direction):
-        return close - entry if direction == 'buy' else entry - close
+        return (close - entry) * direction
     
     def __print_log(self, log, idx=None):
         if self.show_log:
             dt = self.dt[idx] if idx else ''
             print(f'[INFO, {dt}]', log)
 
+    def __phase(self, name: str):
+        return self.profiler.phase(name) if self.profiler is not None else nullcontext()
+
+    def profile_stats(self) -> dict:
+        """
+        Return profiling results of the last run (TradeTester(profile=True)):
+        wall time per phase, number of phase calls and counters
+        """
+        if self.profiler is None:
+            return {}
+        stats = self.profiler.to_dict()
+        counters = stats['counters']
+        # multi position mode doesn't scan forward, it counts visited 'event bars' instead
+        if not self.multi_position:
+            resolved = counters.get('orders filled', 0) + counters.get('orders canceled', 0)
+            counters['avg forward scan length'] = counters.get('bars scanned', 0) / resolved if resolved else 0
+        return stats
+
     def run_strategy(self, n):
-        # iterate through each bar
-        for idx in tqdm(range(len(self.cl) - n)):
-            dti = self.dt[idx]
-            opi = self.op[idx]
-            hii = self.hi[idx]
-            loi = self.lo[idx]
-            cli = self.cl[idx]
-
-            # If uptrend and BUY condition
-            if not self.in_market:
-                if self.trend[idx] == 1 and self.entries[idx] == 1 and self.filters[idx] == 1:
-                    sl = self.__get_sl(idx, 1)
-                    tp = self.__get_tp(idx, 1)
-                    self.order = Order(order_status='stop',
-                                    order_dir='buy',
-                                    open_dt=dti,
-                                    open_price=hii + self.indent,
-                                    bar_id=idx,
-                                    close_bar_id=None,
-                                    close_price=None,
-                                    close_dt=None,
-                                    sl=sl,
-                                    tp=tp)
-                    self.in_market = True
-                    self.__print_log(f'BUY ORDER PENDED at {self.order.open_price}')
-                
-                # If downtrend and SELL condition
-                elif self.trend[idx] == -1 and self.entries[idx] == -1 and self.filters[idx] == 1:
-                    sl = self.__get_sl(idx, -1)
-                    tp = self.__get_tp(idx, -1)
-                    self.order = Order(order_status='stop',
-                                    order_dir='sell',
-                                    open_dt=dti,
-                                    open_price=loi - self.indent,
-                                    bar_id=idx,
-                                    close_bar_id=None,
-                                    close_price=None,
-                                    close_dt=None,
-                                    sl=sl,
-                                    tp=tp)
-                    self.in_market = True
-                    self.__print_log(f'SELL ORDER PENDED at {self.order.open_price}', idx)
-
-            # If order was set
-            elif self.in_market:
-                # for i in range(n):
-                for i in range(self.cl.shape[0] - idx):
-                    dtn = self.dt[idx + i]  # dtn - dt next
-                    opn = self.op[idx + i]
-                    hin = self.hi[idx + i]
-                    lon = self.lo[idx + i]
-                    cln = self.cl[idx + i]
-
-                    # Work with pended orders
-                    if self.order.order_status == 'stop':
-                        if self.order.order_dir == 'buy':
-                            if hin > self.order.open_price:
-                                self.order.order_status = 'in market'
-                                self.__print_log(f'ORDER IN MARKET at {self.order.open_price}', idx)
-                                
-                        elif self.order.order_dir == 'sell':
-                            if lon < self.order.open_price:
-                                self.order.order_status = 'in market'
-                                self.__print_log(f'ORDER IN MARKET at {self.order.open_price}', idx)
-
-                    # Work with market orders
-                    elif self.order.order_status == 'in market':
-                        # if BUY order
-                        if self.order.order_dir == 'buy':
-                            if lon <= self.order.sl:
-                                self.__close_order(self.order.sl, idx+i, 'sl')
-                                break
-                            elif hin >= self.order.tp:
-                                self.__close_order(self.order.tp, idx+i, 'tp')
-                                break
-                        # if SELL order
-                        elif self.order.order_dir == 'sell':
-                            if hin >= self.order.sl:
-                                self.__close_order(self.order.sl, idx+i, 'sl')
-                                break
-                            elif lon <= self.order.tp:
-                                self.__close_order(self.order.tp, idx+i, 'tp')
-                                break
-
-                # If order still in work
-                if self.order.order_status == 'stop':
-                    self.__close_order(self.order.open_price, idx+i, 'canceled')
-                    continue
-                elif self.order.order_status == 'in market':
-                    self.__close_order(cln, idx+i, 'closed')
-                    continue
+        self.profiler = Profiler() if self.profile else None
 
-        self.__form_order_book()
+        with self.__phase('levels'):
+            self.prepare_levels()
+        with self.__phase('signals'):
+            self.prepare_signals()
+        last_idx = len(self.cl) - n
 
-    def __append_order_into_orderbook(self):
+        with self.__phase('simulation'):
+            if self.multi_position:
+                self.__run_positions(last_idx)
+            else:
+                self.__run_single(last_idx)
+
+        with self.__phase('order book'):
+            self.__form_order_book()
+
+    def __run_single(self, last_idx: int):
         """
-        Append order data into order book
-        :return:
+        Every signal pends an order, which is resolved at once by searching forward for its fill and exit.
+        The next signal is taken from the second bar after the previous one
         """
-        self.orderBook['bar_id'].append(self.order.bar_id)
-        self.orderBook['order_dir'].append(self.order.order_dir)
-        self.orderBook['open_dt'].append(self.order.open_dt)
-        self.orderBook['open_price'].append(self.order.open_price)
-        self.orderBook['close_dt'].append(self.order.close_dt)
-        self.orderBook['close_bar_id'].append(self.order.close_bar_id)
-        self.orderBook['close_price'].append(self.order.close_price)
-        self.orderBook['status'].append(self.order.order_status)
-        self.orderBook['profit'].append(self.__calculate_profit(self.order.open_price,
-                                                                self.order.close_price,
-                                                                self.order.order_dir))
-        return
+        # Order pended in the previous run is resolved on the first bar
+        next_idx = 0
+        if self.in_market and last_idx > 0:
+            self.__fill_order(0)
+            next_idx = 1
+
+        # iterate only through bars with signals
+        candidates = np.flatnonzero(self.signals[:last_idx])
+        if self.profiler is not None:
+            self.profiler.count('signals', candidates.shape[0])
+
+        for idx in tqdm(candidates, disable=not self.show_progress):
+            # The bar after the signal is used to resolve the order, so it can't open a new one
+            if idx < next_idx:
+                continue
+
+            self.__open_order(idx, self.signals[idx])
+            if idx + 1 >= last_idx:
+                break
+
+            self.__fill_order(idx + 1)
+            next_idx = idx + 2
+
+    def __run_positions(self, last_idx: int):
+        """
+        Simulation with several open orders. Open orders are indexed by their levels (OpenOrders),
+        so only bars with signals or crossed levels are visited, and they check only the crossed orders.
+        A signal pends an order if less than max_positions orders are open.
+        Orders left at the end of data are canceled or closed by the last close price
+        """
+        book = self.orderBook
+        orders = OpenOrders()
+        last = self.cl.shape[0] - 1
+        candidates = np.flatnonzero(self.signals[:last_idx])
+        if self.profiler is not None:
+            self.profiler.count('signals', candidates.shape[0])
+
+        progress = tqdm(total=candidates.shape[0], disable=not self.show_progress)
+        signal_pos = 0
+        start = 0
+        while True:
+            next_fill = orders.next_event(self.hi, self.lo, start, book.status)
+            next_signal = candidates[signal_pos] if signal_pos < candidates.shape[0] else -1
+            if next_fill == -1 and next_signal == -1:
+                break
+            idx = max(next_fill, next_signal) if -1 in (next_fill, next_signal) else min(next_fill, next_signal)
+
+            if self.profiler is not None:
+                self.profiler.count('event bars')
+            if idx == next_fill:
+                self.__fill_orders(orders, idx)
+            if idx == next_signal:
+                signal_pos += 1
+                progress.update()
+                if self.max_positions is None or len(orders) < self.max_positions:
+                    trade_dir = self.signals[idx]
+                    row = self.__pend_order(idx, trade_dir)
+                    orders.pend(row, trade_dir, book.open_price[row])
+                elif self.profiler is not None:
+                    self.profiler.count('signals skipped')
+            start = idx + 1
+        progress.close()
+
+        for row in sorted(orders.rows):
+            if book.status[row] == IN_MARKET:
+                self.__close_order(row, self.cl[last], last, CLOSED)
+            else:
+                if self.profiler is not None:
+                    self.profiler.count('orders canceled')
+                self.__close_order(row, book.open_price[row], last, CANCELED)
+
+    def __fill_orders(self, orders: OpenOrders, idx: int):
+        """
+        Process orders, which levels are crossed by the bar idx: close orders by SL, then by TP,
+        then fill pended orders. Filled orders are checked for SL and TP from the next bar,
+        on the entry bar they can be closed only with intrabar data
+        """
+        book = self.orderBook
+        hi = self.hi[idx]
+        lo = self.lo[idx]
+        for row in orders.crossed_stops(hi, lo, book.status):
+            sl, tp, trade_dir = book.sl[row], book.tp[row], book.order_dir[row]
+            status = SL
+            if self.intrabar is not None and self.__touched_levels(idx, sl, tp, trade_dir)[1]:
+                if self.profiler is not None:
+                    self.profiler.count('intrabar resolutions')
+                status = self.intrabar.resolve_exit(*self.__bar_bounds(idx), sl, tp, trade_dir)
+            self.__close_order(row, sl if status == SL else tp, idx, status)
+            orders.close(row)
+
+        for row in orders.crossed_takes(hi, lo, book.status):
+            self.__close_order(row, book.tp[row], idx, TP)
+            orders.close(row)
+
+        for row in orders.crossed_entries(hi, lo, book.status):
+            book.status[row] = IN_MARKET
+            if self.profiler is not None:
+                self.profiler.count('orders filled')
+            self.__print_log(f'ORDER IN MARKET at {book.open_price[row]}', idx)
+
+            sl, tp, trade_dir = book.sl[row], book.tp[row], book.order_dir[row]
+            # The order can be closed on the entry bar only if the bar touches SL or TP, lower timeframe shows the order
+            if self.intrabar is not None and self.__touches_levels(idx, sl, tp, trade_dir):
+                if self.profiler is not None:
+                    self.profiler.count('intrabar resolutions')
+                status = self.intrabar.resolve_entry_exit(*self.__bar_bounds(idx), book.open_price[row], sl, tp, trade_dir)
+                if status is not None:
+                    self.__close_order(row, sl if status == SL else tp, idx, status)
+                    orders.close(row)
+                    continue
+            orders.fill(row, trade_dir, sl, tp)
+
+    def __pend_order(self, idx: int, trade_dir: int) -> int:
+        """
+        Pend stop order over the high of the bar for BUY signal or under the low for SELL signal
+        :return: row of the order in the order book
+        """
+        open_price = self.hi[idx] + self.indent if trade_dir == BUY else self.lo[idx] - self.indent
+        row = self.orderBook.open_order(bar_id=idx,
+                                        order_dir=trade_dir,
+                                        open_price=open_price,
+                                        sl=self.__get_sl(idx, trade_dir),
+                                        tp=self.__get_tp(idx, trade_dir))
+        if self.profiler is not None:
+            self.profiler.count('orders created')
+        self.__print_log(f'{"BUY" if trade_dir == BUY else "SELL"} ORDER PENDED at {open_price}', idx)
+        return row
+
+    def __open_order(self, idx: int, trade_dir: int):
+        self.order = self.__pend_order(idx, trade_dir)
+        self.in_market = True
+
+    def __fill_order(self, idx: int):
+        if self.profiler is None:
+            return self.__search_fill(idx)
+        with self.profiler.phase('fill search'):
+            return self.__search_fill(idx)
+
+    def __search_fill(self, idx: int):
+        """
+        Resolve pended order starting from bar idx.
+        Find the bar, where the entry level is crossed, then the first bar, where SL or TP is touched.
+        If the entry level is never crossed, the order is canceled on the last bar,
+        if neither SL nor TP is touched, the order is closed by the last close price
+        """
+        book = self.orderBook
+        row = self.order
+        last = self.cl.shape[0] - 1
+        trade_dir = book.order_dir[row]
+        open_price = book.open_price[row]
+        sl = book.sl[row]
+        tp = book.tp[row]
+
+        if trade_dir == BUY:
+            entry_idx = first_touch(self.hi, idx, open_price, 1)
+        else:
+            entry_idx = first_touch(self.lo, idx, open_price, -1)
+
+        if entry_idx == -1:
+            if self.profiler is not None:
+                self.profiler.count('orders canceled')
+                self.profiler.count('bars scanned', last + 1 - idx)
+            self.__close_order(row, open_price, last, CANCELED)
+            return
+
+        book.status[row] = IN_MARKET
+        self.__print_log(f'ORDER IN MARKET at {open_price}', entry_idx)
+
+        # The order can be closed on the entry bar only if the bar touches SL or TP, lower timeframe shows the order
+        if self.intrabar is not None and self.__touches_levels(entry_idx, sl, tp, trade_dir):
+            if self.profiler is not None:
+                self.profiler.count('intrabar resolutions')
+            status = self.intrabar.resolve_entry_exit(*self.__bar_bounds(entry_idx), open_price, sl, tp, trade_dir)
+            if status is not None:
+                if self.profiler is not None:
+                    self.profiler.count('orders filled')
+                    self.profiler.count('bars scanned', entry_idx + 1 - idx)
+                self.__close_order(row, sl if status == SL else tp, entry_idx, status)
+                return
+
+        # SL and TP are checked from the next bar after the entry, SL has priority on the same bar
+        exit_idx = first_exit(self.hi, self.lo, entry_idx + 1, sl, tp, trade_dir)
+        if self.profiler is not None:
+            self.profiler.count('orders filled')
+            self.profiler.count('bars scanned', (exit_idx if exit_idx != -1 else last) + 1 - idx)
+        if exit_idx == -1:
+            self.__close_order(row, self.cl[last], last, CLOSED)
+            return
+
+        sl_touched, tp_touched = self.__touched_levels(exit_idx, sl, tp, trade_dir)
+        if sl_touched and tp_touched and self.intrabar is not None:
+            if self.profiler is not None:
+                self.profiler.count('intrabar resolutions')
+            status = self.intrabar.resolve_exit(*self.__bar_bounds(exit_idx), sl, tp, trade_dir)
+            self.__close_order(row, sl if status == SL else tp, exit_idx, status)
+        elif sl_touched:
+            self.__close_order(row, sl, exit_idx, SL)
+        else:
+            self.__close_order(row, tp, exit_idx, TP)
+
+    def __touched_levels(self, idx: int, sl: float, tp: float, trade_dir: int):
+        """Return (SL is touched, TP is touched) by the bar"""
+        if trade_dir == BUY:
+            return self.lo[idx] <= sl, self.hi[idx] >= tp
+        return self.hi[idx] >= sl, self.lo[idx] <= tp
 
-    def __close_order(self, close_price, idx, status: Literal['tp', 'sl', 'canceled', 'closed']):
-        self.order.order_status = status
-        self.order.close_price = close_price
-        # self.order.close_dt = close_datetime
-        self.order.close_dt = self.dt[idx]
-        self.order.close_bar_id = idx
-        profit = self.__calculate_profit(self.order.open_price,
-                                         self.order.close_price,
-                                         self.order.order_dir)
+    def __touches_levels(self, idx: int, sl: float, tp: float, trade_dir: int):
+        sl_touched, tp_touched = self.__touched_levels(idx, sl, tp, trade_dir)
+        return sl_touched or tp_touched
+
+    def __close_order(self, row: int, close_price, idx, status: int):
+        """
+        Close the order in the row of the order book
+        status: TP, SL, CANCELED or CLOSED code from order_book
+        """
+        self.orderBook.close_order(row, idx, close_price, status)
+        profit = self.__calculate_profit(self.orderBook.open_price[row],
+                                         close_price,
+                                         self.orderBook.order_dir[row])
         self.__print_log(f'ORDER CLOSED with profit: {profit}')
-        self.__append_order_into_orderbook()
         self.in_market = False
         return
 
-    def __win_lose_draw(self, profit: pd.Series):
-        if profit > 0:
-            return 'win'
-        elif profit < 0:
-            return 'lose'
-        else: return 'canceled'
-
     def __order_lifetime(self, open_time, close_time):
         "Return order lifetime in hours"
         diff = pd.to_datetime(close_time) - pd.to_datetime(open_time)
         return diff.total_seconds() / 3600
     
     def __form_order_book(self):
-        self.orderBookDf = pd.DataFrame(self.orderBook)
-        self.orderBookDf['bars_in_deal'] = self.orderBookDf['close_bar_id'] - self.orderBookDf['bar_id']
-        self.orderBookDf['win/lose'] = self.orderBookDf['profit'].apply(self.__win_lose_draw)
-        self.returns = pd.Series(data=self.orderBookDf[self.orderBookDf['win/lose'] != 'canceled']['profit'].values, 
-                                 index=self.orderBookDf[self.orderBookDf['win/lose'] != 'canceled']['open_dt'].values)
+        self.orderBookDf = self.orderBook.to_frame(self.dt)
+        not_canceled = (self.orderBookDf['win/lose'] != 'canceled').values
+        self.returns = pd.Series(data=self.orderBookDf['profit'].values[not_canceled], 
+                                 index=self.orderBookDf['open_dt'].values[not_canceled])
         return 
     
     def form_order_statistic(self):
-        profit = self.orderBookDf['profit']
-        win_lose_ratio = self.orderBookDf[self.orderBookDf['win/lose'] != 'canceled']['win/lose'].value_counts(normalize=True).to_frame().T
-        win_lose_draw_ratio = self.orderBookDf['win/lose'].value_counts(normalize=True).to_frame().T
-
-        win_orders = self.orderBookDf[profit > 0]
-        lose_orders = self.orderBookDf[profit < 0]
-
-        trade_drawdown, max_drawdown = drawdown(profit)
-
-        order_count = self.orderBookDf[self.orderBookDf['win/lose'] != 'canceled'].shape[0]
-        canceled = self.orderBookDf[self.orderBookDf['win/lose'] == 'canceled'].shape[0]
-
-        stat = pd.DataFrame({
-            'Orders count:': order_count,
-            'Canceled:': canceled,
-            'Canceled %:': canceled * 100 / order_count,
-            'Win %:': win_lose_ratio['win'].values[0] * 100,
-            'Lose %:': win_lose_ratio['lose'].values[0] * 100,
-            'Avg Profit (pips):': (win_orders['profit'].mean()) / self.points,
-            'Avg Loss (pips):': (lose_orders['profit'].mean()) / self.points,
-            'PnL order ratio:': win_lose_ratio['win'].values[0] / (win_lose_ratio['lose'].values[0] + win_lose_ratio['win'].values[0]),
-            'PnL profit ratio:': win_orders['profit'].mean() / abs(lose_orders['profit'].mean()),
-            'Total (pips):': (profit.cumsum().values[-1]) / self.points,
-            'Drawdown %:': max_drawdown.min(),
-            'Sharp Ratio:': sharp_ratio(profit)
-        }, index=['statistic'])
+        with self.__phase('statistic'):
+            return self.__form_order_statistic()
+
+    def __form_order_statistic(self):
+        stat = order_statistic_frame(self.orderBookDf['profit'].values, self.points, index=['statistic'])
         # return stat.T.to_markdown(tablefmt="grid")
         return stat
 
-    def show_orders_statistic(self):
-        profit = self.orderBookDf['profit']
-        trade_drawdown, max_drawdown = drawdown(profit)
+    def show_orders_statistic(self, show: bool = True, max_points: int = MAX_POINTS):
+        """
+        Plot statistic of the orders. Long series are decimated to max_points (see plotting.py)
+        show: call plt.show(), set False to get the figure only
+        """
+        with self.__phase('plot'):
+            fig = draw_statistic(plt.figure(figsize=(10, 8)), self.orderBookDf, self.returns, max_points)
+            if show:
+                plt.show()
+            return fig
 
-        fig, ax = plt.subplots(2, 2, figsize=(10, 8))
-        ax[0, 0].set_title('Account gain')
-        ax[0, 0].plot(self.orderBookDf.open_dt, profit.cumsum())
-        ax[0, 0].set_xlabel('Date')
-        ax[0, 0].set_ylabel('Account')
-        ax[0, 0].xaxis.set_tick_params(rotation=45)
-        
-        ax[0, 1].set_title('Returns distribution')
-        ax[0, 1].hist(self.returns, bins=30)
-        ax[0, 1].vlines(0, 
-                        ymin=0, 
-                        ymax=ax[0, 1].get_ylim()[1],
-                        colors='k', linestyles='dashed')
-        ax[0, 1].set_xlabel('Returns')
-        ax[0, 1].set_ylabel('Count')
-        
-        ax[1, 0].set_title('Drawdown')
-        ax[1, 0].plot(self.orderBookDf.open_dt, trade_drawdown)
-        ax[1, 0].plot(self.orderBookDf.open_dt, max_drawdown)
-        ax[1, 0].set_xlabel('Date')
-        ax[1, 0].set_ylabel('Drawdown')
-        ax[1, 0].xaxis.set_tick_params(rotation=45)
-
-        ax[1, 1].set_title('Order lifetime')
-        ax[1, 1].scatter(self.orderBookDf['bars_in_deal'], profit)
-        ax[1, 1].set_xlabel('Bars')
-        ax[1, 1].set_ylabel('Profit')
-
-        fig.suptitle("Overview", fontsize=16)
-        plt.tight_layout()
-        plt.show()
-        return fig
-    
+    def render_orders_statistic(self, fmt: Literal['png', 'svg'] = 'png', max_points: int = MAX_POINTS, dpi: int = 100) -> bytes:
+        """
+        Headless version of show_orders_statistic for workers and web apps:
+        return PNG or SVG image of the statistic, pyplot isn't used
+        """
+        with self.__phase('plot'):
+            fig = draw_statistic(Figure(figsize=(10, 8)), self.orderBookDf, self.returns, max_points)
+            return render_figure(fig, fmt, dpi)
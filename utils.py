@@ -1,7 +1,10 @@
+import sys
 from typing import Literal
 from datetime import datetime
 from indicators import donchian_channel
+from filters import build_filter
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 import talib as ta
 import pandas as pd
 
@@ -25,12 +28,59 @@ def get_candle_form(op: pd.Series, hi: pd.Series, lo: pd.Series, cl: pd.Series,
                      axis=1, keys='body_size, candle_size, upper_wick, lower_wick'.split(', '))
 
 
-def expand_for_n_candles(df, num_shifts):
-    shifted_df = pd.concat([df.shift(i) for i in range(1, num_shifts)], axis=1)
-    shifted_df.columns = [f'{col}_shifted_{i}' for i in range(1, num_shifts) for col in df.columns]
-    joined_df = pd.concat([df, shifted_df], axis=1)
-    joined_df = joined_df.dropna()  # to remove rows with NaN values caused by shifting
-    return joined_df
+def lag_view(values: np.ndarray, n_lags: int) -> np.ndarray:
+    """
+    Return read-only view (n_bars - n_lags + 1, n_lags, n_features) of 2-D values (n_bars, n_features) without copying.
+    view[i, j] is the bar (i + n_lags - 1) shifted by j bars, so lag 0 is the current bar
+    """
+    windows = sliding_window_view(values, n_lags, axis=0)   # (n_windows, n_features, n_lags)
+    return windows[:, :, ::-1].transpose(0, 2, 1)
+
+
+class LaggedFeatures:
+    """
+    Lagged feature matrix of the data frame. Lags are a strided view over the data, they are copied
+    only by to_numpy/to_frame, so N lags don't take N copies of the frame
+    """
+
+    def __init__(self, df: pd.DataFrame, n_lags: int):
+        """
+        :param df: features (e.g. get_candle_form output)
+        :param n_lags: number of bars in each row: the current bar and n_lags - 1 previous bars
+        """
+        self.df = df
+        self.n_lags = n_lags
+        self.values = df.to_numpy()
+        self.view = lag_view(self.values, n_lags)
+        self.index = df.index[n_lags - 1:]
+        self.columns = list(df.columns) + [f'{col}_shifted_{i}' for i in range(1, n_lags) for col in df.columns]
+
+    @property
+    def valid(self) -> np.ndarray:
+        """Boolean mask of the view rows without NaN values"""
+        nan_count = np.concatenate([[0], np.cumsum(np.isnan(self.values).any(axis=1))])
+        return nan_count[self.n_lags:] == nan_count[:nan_count.shape[0] - self.n_lags]
+
+    def to_numpy(self, dtype=np.float32, dropna: bool = True) -> np.ndarray:
+        """Materialize 2-D matrix (rows, n_lags * n_features), lag by lag, so only the result is allocated"""
+        rows = np.flatnonzero(self.valid) if dropna else np.arange(self.view.shape[0])
+        out = np.empty((rows.shape[0], self.n_lags, self.values.shape[1]), dtype=dtype)
+        for lag in range(self.n_lags):
+            out[:, lag, :] = self.view[rows, lag, :]
+        return out.reshape(rows.shape[0], -1)
+
+    def to_frame(self, dtype=np.float32, dropna: bool = True) -> pd.DataFrame:
+        """The same frame as expand_for_n_candles returns"""
+        index = self.index[self.valid] if dropna else self.index
+        return pd.DataFrame(self.to_numpy(dtype, dropna), index=index, columns=self.columns, copy=False)
+
+
+def expand_for_n_candles(df, num_shifts, dtype=np.float64):
+    """
+    Join df with its values shifted by 1 .. num_shifts - 1 bars (columns '{col}_shifted_{i}').
+    Rows with NaN values (caused by shifting) are removed. Set dtype=np.float32 to halve the memory
+    """
+    return LaggedFeatures(df, num_shifts).to_frame(dtype)
 
 
 def create_filter(data: pd.DataFrame, query: str):
@@ -39,6 +89,29 @@ def create_filter(data: pd.DataFrame, query: str):
     and returns np.array, containing 1 and 0.
     1 if condition is True
     Otherwise 0
+    The query is evaluated directly into the mask (see filters.FilterBuilder), rows aren't copied
+    """
+    frame = sys._getframe(1)
+    return build_filter(data, query, local_dict={**frame.f_globals, **frame.f_locals})
+
+
+def random_walk_ohlc(n_bars: int, seed: int = 0, start_price: float = 1.1, volatility: float = 0.0005) -> pd.DataFrame:
+    """
+    Return synthetic OHLCV data as random walk with hourly datetimes.
+    Columns are the same as in eurusd_h1.csv: dt, open, high, low, close, volume
     """
-    mask = data.query(query).index
-    return data.index.isin(mask.values).astype(int)
+    rng = np.random.default_rng(seed)
+    close = start_price + np.cumsum(rng.normal(0, volatility, n_bars))
+    op = np.empty(n_bars)
+    op[0] = start_price
+    op[1:] = close[:-1]
+    hi = np.maximum(op, close) + np.abs(rng.normal(0, volatility / 2, n_bars))
+    lo = np.minimum(op, close) - np.abs(rng.normal(0, volatility / 2, n_bars))
+    return pd.DataFrame({
+        'dt': pd.date_range('2000-01-01', periods=n_bars, freq='h', tz='UTC'),
+        'open': op,
+        'high': hi,
+        'low': lo,
+        'close': close,
+        'volume': rng.integers(100, 5000, n_bars).astype(float)
+    })
@@ -1,5 +1,6 @@
 import MetaTrader5 as mt5
 from datetime import datetime
+import pandas as pd
 
 
 def get_data(pair: str,
@@ -8,7 +9,8 @@ def get_data(pair: str,
              to_date: str = datetime.today().isoformat(),
              date_as_index: bool = True):
     """
-    Return data from MetaTrader5
+    Return data from MetaTrader5. The whole range is downloaded on every call,
+    use mt5_history.fetch_history to keep local history and download only new bars
     :param pair: Symbol name (EURUSD)
     :param timeframe: TimeFrame (mt5.TIMEFRAME_H1)
     :param from_date: start date (ISO FORMAT)
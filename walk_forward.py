@@ -0,0 +1,94 @@
+from sweep import shared_pool, run_config, config_statistic, sma_mfi_signals
+import numpy as np
+import pandas as pd
+
+
+def walk_forward_splits(n_bars: int, train_size: int, test_size: int, anchored: bool = False, step: int = None) -> list[tuple]:
+    """
+    Split bars into train/test windows
+    :param n_bars: number of bars in data
+    :param train_size: number of bars in train window (the first one for anchored mode)
+    :param test_size: number of bars in test window
+    :param anchored: if True, every train window starts from the first bar, otherwise it's rolling
+    :param step: shift between folds, default is test_size, so test windows don't overlap
+    :return: list of (train_start, train_end, test_start, test_end), ends are exclusive
+    """
+    step = step or test_size
+    splits = []
+    start = 0
+    while start + train_size + test_size <= n_bars:
+        train_start = 0 if anchored else start
+        train_end = start + train_size
+        splits.append((train_start, train_end, train_end, train_end + test_size))
+        start += step
+    return splits
+
+
+def _run_fold(task):
+    """Optimize configs on the train window and apply the best one to the test window"""
+    fold, (train_start, train_end, test_start, test_end), configs, metric, maximize = task
+
+    best_config, best_value = None, None
+    for config in configs:
+        value = config_statistic(run_config(config, train_start, train_end)).get(metric, np.nan)
+        if pd.isna(value):
+            continue
+        if best_value is None or (value > best_value if maximize else value < best_value):
+            best_config, best_value = config, value
+
+    summary = {'fold': fold, 'train_start': train_start, 'train_end': train_end,
+               'test_start': test_start, 'test_end': test_end, f'train {metric}': best_value}
+    if best_config is None:
+        return summary, None
+
+    tester = run_config(best_config, test_start, test_end)
+    order_book = tester.orderBookDf.copy()
+    order_book['bar_id'] += test_start
+    order_book['close_bar_id'] += test_start
+    order_book['fold'] = fold
+
+    summary.update(best_config)
+    summary.update(config_statistic(tester))
+    return summary, order_book
+
+
+def walk_forward(data: pd.DataFrame,
+                 configs: list[dict],
+                 train_size: int,
+                 test_size: int,
+                 metric: str = 'Total (pips):',
+                 maximize: bool = True,
+                 anchored: bool = False,
+                 step: int = None,
+                 signal_builder=sma_mfi_signals,
+                 points: float = 0.00001,
+                 n_workers: int = None):
+    """
+    Walk-forward optimization. For each fold the config with the best metric on the train window
+    is tested on the next test window. Folds are evaluated concurrently in a process pool,
+    signals and SL/TP levels are calculated once per worker for the whole series and reused by all folds.
+    :param data: OHLC data with columns 'dt', 'open', 'high', 'low', 'close', 'volume'
+    :param configs: list of configs (see sweep.param_grid)
+    :param train_size: number of bars in train window
+    :param test_size: number of bars in test window
+    :param metric: column of form_order_statistic to optimize
+    :param maximize: if False, metric is minimized
+    :param anchored: anchored or rolling train windows (see walk_forward_splits)
+    :param step: shift between folds, default is test_size
+    :param signal_builder: see sweep.run_sweep
+    :param points: 1 pip for the instrument
+    :param n_workers: number of processes, default is the number of CPUs
+    :return: (folds, order_book)
+        folds: pd.DataFrame, one row per fold with the chosen config, its train metric and test statistic
+        order_book: stitched out-of-sample order book, bar ids are indices in data
+    """
+    splits = walk_forward_splits(data.shape[0], train_size, test_size, anchored, step)
+    tasks = [(fold, split, configs, metric, maximize) for fold, split in enumerate(splits)]
+
+    with shared_pool(data, signal_builder, points, n_workers) as executor:
+        results = list(executor.map(_run_fold, tasks))
+
+    folds = pd.DataFrame([summary for summary, _ in results])
+    order_books = [order_book for _, order_book in results if order_book is not None]
+    order_book = pd.concat(order_books, ignore_index=True) if order_books else pd.DataFrame()
+    return folds, order_book